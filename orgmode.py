@@ -2,14 +2,22 @@
 Settings in Global.sublime-settings are:
 - orgmode.open_link.resolvers: See DEFAULT_OPEN_LINK_RESOLVERS.
 - orgmode.open_link.resolver.abstract.commands: See DEFAULT_OPEN_LINK_COMMANDS in resolver.abstract.
+- orgmode.open_link.resolver.debug: Print link resolver load timings to the console.
+- orgmode.link_completion.max_results: See DEFAULT_LINK_COMPLETION_MAX_RESULTS.
 For more settings see headers of specific resolvers.
 '''
 
+import os
 import re
+import time
+import threading
+from bisect import bisect_left, bisect_right
 
 import sublime
 import sublime_plugin
 
+import resolver as resolver_registry
+
 
 DEFAULT_OPEN_LINK_RESOLVERS = [
     'jira',
@@ -20,45 +28,27 @@ DEFAULT_OPEN_LINK_RESOLVERS = [
     'local_file',
 ]
 
+# Max number of file names offered when completing links to local files.
+DEFAULT_LINK_COMPLETION_MAX_RESULTS = 100
+
 
-def find_resolvers():
-    from os.path import splitext, split
-    from glob import glob
-    path = 'resolver'
-    files = glob('%s/*.py' % path)
-    available_resolvers = dict()
-    for pos, file_ in enumerate(files[:]):
-        name = splitext(file_)[0]
-        patharr = split(name)
-        module, name = '.'.join(patharr), patharr[-1:]
-        # print 'module =', module, 'name =', name, 'patharr =', patharr
-        module = __import__(module, globals(), locals(), name)
-        module = reload(module)
-
-        if '__init__' in file_ or 'abstract' in file_:
-            continue
-        name = name[0]
-        # print name, module
-        available_resolvers[name] = module
-    return available_resolvers
-available_resolvers = find_resolvers()
+def print_debug(message):
+    print 'orgmode: %s' % message
 
 
 class OrgmodeOpenLinkCommand(sublime_plugin.TextCommand):
 
-    def __init__(self, *args, **kwargs):
-        super(OrgmodeOpenLinkCommand, self).__init__(*args, **kwargs)
+    def get_dispatcher(self):
         settings = sublime.load_settings('Global.sublime-settings')
+        if settings.get('orgmode.open_link.resolver.debug', False):
+            resolver_registry.set_debug_hook(print_debug)
+        else:
+            resolver_registry.set_debug_hook(None)
         wanted_resolvers = settings.get('orgmode.open_link.resolvers', DEFAULT_OPEN_LINK_RESOLVERS)
-        self.resolvers = [available_resolvers[name].Resolver(self.view) \
-                          for name in wanted_resolvers]
+        return resolver_registry.get_dispatcher(wanted_resolvers)
 
     def resolve(self, content):
-        for resolver in self.resolvers:
-            result = resolver.resolve(content)
-            if result is not None:
-                return resolver, result
-        return None, None
+        return self.get_dispatcher().resolve(content, self.view)
 
     def is_valid_scope(self, sel):
         scope_name = self.view.scope_name(sel.end())
@@ -81,7 +71,62 @@ class OrgmodeOpenLinkCommand(sublime_plugin.TextCommand):
             if content is None:
                 sublime.error_message('Could not resolve link:\n%s' % content)
                 continue
-            resolver.execute(content)
+            resolver.execute(content, view)
+
+
+class OrgmodeOpenAllLinksCommand(OrgmodeOpenLinkCommand):
+    '''Open every link within the selections or, without a selection, within
+    the whole buffer. Every link is opened only once.'''
+
+    def find_links(self):
+        view = self.view
+        # Internal links ({1}, {{Headline}}) are jumped to, not opened.
+        regions = view.find_by_selector('orgmode.link - orgmode.link.internal')
+        sels = [sel for sel in view.sel() if not sel.empty()]
+        if not sels:
+            return regions
+        return [region for region in regions
+                if any(sel.intersects(region) or sel.contains(region) for sel in sels)]
+
+    def run(self, edit):
+        view = self.view
+        dispatcher = self.get_dispatcher()
+        seen = set()
+        opened = set()
+        batches = []  # [(resolver, [content, ...]), ...] in order of appearance
+        batch_of = dict()  # opener command -> contents
+        unresolved = 0
+        for region in self.find_links():
+            content = self.extract_content(region)
+            if content in seen:
+                continue
+            seen.add(content)
+            resolver, result = dispatcher.resolve(content, view)
+            if result is None:
+                unresolved += 1
+                continue
+            if result is True:  # Already opened within sublime.
+                continue
+            if not isinstance(result, basestring):
+                resolver.execute(result, view)
+                continue
+            if result in opened:
+                continue
+            opened.add(result)
+            # Links of all resolvers using the same opener go into one batch.
+            key = tuple(resolver.get_link_command() or ())
+            contents = batch_of.get(key)
+            if contents is None:
+                contents = batch_of[key] = []
+                batches.append((resolver, contents))
+            contents.append(result)
+        num_links = 0
+        for resolver, contents in batches:
+            resolver.execute_many(contents, view)
+            num_links += len(contents)
+        if unresolved:
+            sublime.error_message('Could not resolve %d links.' % unresolved)
+        sublime.status_message('Opened %d links.' % num_links)
 
 
 class OrgmodeOpenPythonRefCommand(OrgmodeOpenLinkCommand):
@@ -139,6 +184,138 @@ class OrgmodeCycleInternalLinkCommand(sublime_plugin.TextCommand):
             view.show_at_center(found)
 
 
+class OutlineIndex(object):
+
+    def __init__(self):
+        self.invalidate()
+
+    def invalidate(self):
+        self.lines = None
+        self.indents = None
+        self.parents = None
+        self.children = None
+        self.dirty = False
+
+    def measure(self, content):
+        if not len(content.strip()):
+            return None
+        return len(content) - len(content.lstrip(' \t\r\f\v'))
+
+    def build(self, view):
+        content = view.substr(sublime.Region(0, view.size()))
+        self.lines = content.split('\n')
+        self.indents = [self.measure(line) for line in self.lines]
+        self.parents = None
+        self.dirty = False
+
+    def link(self):
+        indents = self.indents
+        parents = [None] * len(indents)
+        children = dict()
+        stack = []
+        for row, indent in enumerate(indents):
+            if indent is None:
+                continue
+            while stack and indents[stack[-1]] >= indent:
+                stack.pop()
+            parent = stack[-1] if stack else None
+            parents[row] = parent
+            children.setdefault(parent, []).append(row)
+            stack.append(row)
+        self.parents = parents
+        self.children = children
+
+    def sync(self, view):
+        '''Catch up with modifications made anywhere in the view. The buffer
+        is read once and only the rows between the first and the last changed
+        one are measured again.'''
+        lines = view.substr(sublime.Region(0, view.size())).split('\n')
+        self.dirty = False
+        old_lines = self.lines
+        limit = min(len(old_lines), len(lines))
+        first = 0
+        while first < limit and old_lines[first] == lines[first]:
+            first += 1
+        if first == len(old_lines) == len(lines):
+            return
+        old_last, last = len(old_lines) - 1, len(lines) - 1
+        while old_last >= first and last >= first and old_lines[old_last] == lines[last]:
+            old_last -= 1
+            last -= 1
+        indents = [self.measure(line) for line in lines[first:last + 1]]
+        if old_last - first != last - first or indents != self.indents[first:old_last + 1]:
+            self.parents = None
+        self.lines = lines
+        self.indents[first:old_last + 1] = indents
+
+    def ensure(self, view):
+        if self.lines is None:
+            self.build(view)
+        elif self.dirty:
+            self.sync(view)
+        if self.parents is None:
+            self.link()
+        return self
+
+    def read_rows(self, view, first, last):
+        text_point = view.text_point
+        region = sublime.Region(text_point(first, 0), view.line(text_point(last, 0)).end())
+        return view.substr(region).split('\n')
+
+    def replace_rows(self, first, last, lines):
+        self.lines[first:last + 1] = lines
+        self.indents[first:last + 1] = [self.measure(line) for line in lines]
+        self.parents = None
+
+    def refresh_rows(self, view, rows):
+        '''Re-read rows a command just edited. Edits made elsewhere are left
+        to sync().'''
+        if self.lines is None:
+            return
+        for row in rows:
+            old_indent = self.indents[row]
+            self.lines[row] = self.read_rows(view, row, row)[0]
+            self.indents[row] = self.measure(self.lines[row])
+            if self.indents[row] != old_indent:
+                self.parents = None
+
+    def parent(self, row):
+        return self.parents[row]
+
+    def first_child(self, row):
+        children = self.children.get(row)
+        if children:
+            return children[0]
+
+    def siblings(self, row, parent=None):
+        if parent is None:
+            parent = self.parents[row]
+        indent = self.indents[row]
+        return [sibling for sibling in self.children.get(parent, [])
+                if self.indents[sibling] == indent]
+
+
+outline_indexes = dict()
+
+
+def get_outline_index(view):
+    index = outline_indexes.get(view.id())
+    if index is None:
+        index = outline_indexes[view.id()] = OutlineIndex()
+    return index.ensure(view)
+
+
+class OrgmodeOutlineIndexObserver(sublime_plugin.EventListener):
+
+    def on_modified(self, view):
+        index = outline_indexes.get(view.id())
+        if index is not None:
+            index.dirty = True
+
+    def on_close(self, view):
+        outline_indexes.pop(view.id(), None)
+
+
 class AbstractCheckboxCommand(sublime_plugin.TextCommand):
 
     def __init__(self, *args, **kwargs):
@@ -148,6 +325,10 @@ class AbstractCheckboxCommand(sublime_plugin.TextCommand):
         self.indent_regex = re.compile(indent_pattern)
         self.summary_regex = re.compile(summary_pattern)
 
+    @property
+    def outline(self):
+        return get_outline_index(self.view)
+
     def get_indent(self, content):
         if type(content) is sublime.Region:
             content = self.view.substr(content)
@@ -155,82 +336,43 @@ class AbstractCheckboxCommand(sublime_plugin.TextCommand):
         indent = match.group(1)
         return indent
 
-    def find_parent(self, region):
+    def row_to_line(self, row):
         view = self.view
-        row, col = view.rowcol(region.begin())
-        line = view.line(region)
-        content = view.substr(line)
-        # print content
-        indent = self.get_indent(content)
-        # print repr(indent)
-        row -= 1
-        found = False
-        while row >= 0:
-            point = view.text_point(row, 0)
-            line = view.line(point)
-            content = view.substr(line)
-            if len(content.strip()):
-                cur_indent = self.get_indent(content)
-                if len(cur_indent) < len(indent):
-                    found = True
-                    break
-            row -= 1
-        if found:
-            # print row
-            point = view.text_point(row, 0)
-            line = view.line(point)
-            return line
+        return view.line(view.text_point(row, 0))
+
+    def find_parent(self, region):
+        row, col = self.view.rowcol(region.begin())
+        row = self.outline.parent(row)
+        if row is not None:
+            return self.row_to_line(row)
 
     def find_child(self, region):
-        view = self.view
-        row, col = view.rowcol(region.begin())
-        line = view.line(region)
-        content = view.substr(line)
-        # print content
-        indent = self.get_indent(content)
-        # print repr(indent)
-        row += 1
-        found = False
-        last_row, _ = view.rowcol(view.size())
-        while row <= last_row:
-            point = view.text_point(row, 0)
-            line = view.line(point)
-            content = view.substr(line)
-            if len(content.strip()):
-                cur_indent = self.get_indent(content)
-                if len(cur_indent) > len(indent):
-                    found = True
-                    break
-            row += 1
-        if found:
-            # print row
-            point = view.text_point(row, 0)
-            line = view.line(point)
-            return line
+        row, col = self.view.rowcol(region.begin())
+        row = self.outline.first_child(row)
+        if row is not None:
+            return self.row_to_line(row)
 
     def find_siblings(self, child, parent):
         view = self.view
-        row, col = view.rowcol(parent.begin())
-        parent_indent = self.get_indent(parent)
-        child_indent = self.get_indent(child)
-        # print '***', repr(parent_indent), repr(child_indent)
+        outline = self.outline
+        parent_row, _ = view.rowcol(parent.begin())
+        child_row, _ = view.rowcol(child.begin())
+        rows = outline.siblings(child_row, parent_row)
+        if not rows:
+            return []
+        # Fetch all siblings with one read and slice the lines out of it.
+        first, last = rows[0], rows[-1]
+        lines = outline.read_rows(view, first, last)
+        offset = view.text_point(first, 0)
+        offsets = []
+        for content in lines:
+            offsets.append(offset)
+            offset += len(content) + 1
         siblings = []
-        row += 1
-        last_row, _ = view.rowcol(view.size())
-        while row <= last_row:  # Don't go past end of document.
-            line = view.text_point(row, 0)
-            line = view.line(line)
-            content = view.substr(line)
-            # print content
-            if len(content.strip()):
-                cur_indent = self.get_indent(content)
-                if len(cur_indent) <= len(parent_indent):
-                    # print 'OUT'
-                    break  # Indent same as parent found!
-                if len(cur_indent) == len(child_indent):
-                    # print 'MATCH'
-                    siblings.append((line, content))
-            row += 1
+        for row in rows:
+            content = lines[row - first]
+            begin = offsets[row - first]
+            siblings.append((sublime.Region(begin, begin + len(content)), content))
         return siblings
 
     def get_summary(self, line):
@@ -250,6 +392,26 @@ class AbstractCheckboxCommand(sublime_plugin.TextCommand):
             view.text_point(row, col_stop),
         )
 
+    def apply_edits(self, edit, edits):
+        # Replace from the bottom up so the regions stay valid. Returns a
+        # function which maps old points to their position after the edits.
+        view = self.view
+        edits = sorted(edits, key=lambda item: item[0].begin())
+        ends = []
+        shifts = []
+        total = 0
+        for region, content in edits:
+            total += len(content) - region.size()
+            ends.append(region.end())
+            shifts.append(total)
+        for region, content in reversed(edits):
+            view.replace(edit, region, content)
+
+        def shift(point):
+            pos = bisect_right(ends, point)
+            return point + shifts[pos - 1] if pos else point
+        return shift
+
     def recalc_summary(self, edit, parent, child):
         view = self.view
         # print parent, child
@@ -261,32 +423,70 @@ class AbstractCheckboxCommand(sublime_plugin.TextCommand):
         num_children = len(children)
         checked_children = len(filter(lambda child: '[X]' in child[1], children))
         # print checked_children, num_children
+        outline = self.outline
         view.replace(edit, summary, '[%d/%d]' % (checked_children, num_children))
+        outline.refresh_rows(view, [view.rowcol(parent.begin())[0]])
         return True
 
 
 class OrgmodeToggleCheckboxCommand(AbstractCheckboxCommand):
 
+    def toggle(self, content):
+        if '[X]' in content:
+            return content.replace('[X]', '[ ]')
+        elif '[ ]' in content:
+            return content.replace('[ ]', '[X]')
+        return content
+
     def run(self, edit):
         view = self.view
+        outline = self.outline
+        rowcol = view.rowcol
         backup = []
+        toggled = dict()  # row -> [(region, content), ...]
+        seen = set()
         for sel in view.sel():
             if 'orgmode.checkbox' not in view.scope_name(sel.end()):
                 continue
             backup.append(sel)
             child = view.extract_scope(sel.end())
-            content = view.substr(child)
-            if '[X]' in content:
-                content = content.replace('[X]', '[ ]')
-            elif '[ ]' in content:
-                content = content.replace('[ ]', '[X]')
-            view.replace(edit, child, content)
-            parent = self.find_parent(child)
-            if parent:
-                self.recalc_summary(edit, parent, child)
+            if child.begin() in seen:
+                continue
+            seen.add(child.begin())
+            row, _ = rowcol(child.begin())
+            content = self.toggle(view.substr(child))
+            toggled.setdefault(row, []).append((child, content))
+        edits = []
+        for changes in toggled.values():
+            edits.extend(changes)
+        # Group children by parent so that every summary is rewritten once.
+        parents = dict()
+        for row in toggled:
+            parent = outline.parent(row)
+            if parent is not None:
+                parents.setdefault(parent, row)
+        for parent_row, child_row in parents.items():
+            parent = self.row_to_line(parent_row)
+            summary = self.get_summary(parent)
+            if not summary:
+                continue
+            rows = outline.siblings(child_row, parent_row)
+            siblings = self.find_siblings(self.row_to_line(child_row), parent)
+            checked_children = 0
+            for row, (line, content) in zip(rows, siblings):
+                # Look at the sibling as it will be after toggling.
+                for child, replacement in reversed(toggled.get(row, [])):
+                    begin = child.begin() - line.begin()
+                    end = child.end() - line.begin()
+                    content = content[:begin] + replacement + content[end:]
+                if '[X]' in content:
+                    checked_children += 1
+            edits.append((summary, '[%d/%d]' % (checked_children, len(siblings))))
+        shift = self.apply_edits(edit, edits)
+        outline.refresh_rows(view, sorted(set(toggled.keys() + parents.keys())))
         view.sel().clear()
         for region in backup:
-            view.sel().add(region)
+            view.sel().add(sublime.Region(shift(region.a), shift(region.b)))
 
 
 class OrgmodeRecalcCheckboxSummaryCommand(AbstractCheckboxCommand):
@@ -308,11 +508,138 @@ class OrgmodeRecalcCheckboxSummaryCommand(AbstractCheckboxCommand):
             view.sel().add(region)
 
 
+class OrgmodeRecalcAllCheckboxSummariesCommand(AbstractCheckboxCommand):
+
+    def run(self, edit):
+        view = self.view
+        outline = get_outline_index(view)
+        outline.build(view)
+        outline.link()
+        lines = outline.lines
+        indents = outline.indents
+        children = outline.children
+        summary_regex = self.summary_regex
+        offsets = []
+        offset = 0
+        for content in lines:
+            offsets.append(offset)
+            offset += len(content) + 1
+        # Walk bottom-up so every child is done before its parent. A child
+        # counts as checked if its checkbox is checked or if it carries a
+        # summary and all of its own children are checked.
+        checked = [False] * len(lines)
+        edits = []
+        changed = dict()
+        for row in xrange(len(lines) - 1, -1, -1):
+            if indents[row] is None:
+                continue
+            content = lines[row]
+            match = summary_regex.search(content)
+            rows = children.get(row)
+            if not match or not rows:
+                checked[row] = '[X]' in content
+                continue
+            rows = outline.siblings(rows[0], row)
+            num_checked = len([child for child in rows if checked[child]])
+            checked[row] = '[X]' in content or num_checked == len(rows)
+            summary = '[%d/%d]' % (num_checked, len(rows))
+            if summary != match.group(1):
+                col_start, col_stop = match.span()
+                region = sublime.Region(offsets[row] + col_start, offsets[row] + col_stop)
+                edits.append((region, summary))
+                changed[row] = content[:col_start] + summary + content[col_stop:]
+        if not edits:
+            sublime.status_message('All checkbox summaries are up to date.')
+            return
+        sels = view.sel()
+        backup = list(sels)
+        shift = self.apply_edits(edit, edits)
+        for row, content in changed.iteritems():
+            outline.replace_rows(row, row, [content])
+        sels.clear()
+        for region in backup:
+            sels.add(sublime.Region(shift(region.a), shift(region.b)))
+        sublime.status_message('Updated %d checkbox summaries.' % len(edits))
+
+
+class DirectoryListingCache(object):
+    '''Sorted directory listings for link completion. Listings are read on a
+    worker thread. A known listing is served right away and revalidated in
+    the background against the mtime of its directory.'''
+
+    def __init__(self, check_interval=2.0):
+        self.check_interval = check_interval
+        self.listings = dict()  # path -> (mtime, names, is_dirs)
+        self.checked = dict()  # path -> time of last validation
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def read(self, path, mtime):
+        names = []
+        is_dirs = []
+        join = os.path.join
+        isdir = os.path.isdir
+        for name in sorted(os.listdir(path)):
+            names.append(name)
+            is_dirs.append(isdir(join(path, name)))
+        return (mtime, names, is_dirs)
+
+    def refresh(self, path, callback):
+        try:
+            mtime = os.stat(path).st_mtime
+            listing = self.listings.get(path)
+            if listing is None or listing[0] != mtime:
+                listing = self.read(path, mtime)
+                changed = True
+            else:
+                changed = False
+        except OSError:
+            listing = (None, [], [])
+            changed = path not in self.listings
+        self.lock.acquire()
+        try:
+            self.listings[path] = listing
+            self.checked[path] = time.time()
+            self.pending.discard(path)
+        finally:
+            self.lock.release()
+        if changed and callback is not None:
+            sublime.set_timeout(callback, 0)
+
+    def get(self, path, callback=None):
+        '''Returns (names, is_dirs) or None if the listing is not known yet.
+        In that case callback is called once it has been read.'''
+        self.lock.acquire()
+        try:
+            listing = self.listings.get(path)
+            outdated = time.time() - self.checked.get(path, 0) > self.check_interval
+            start = outdated and path not in self.pending
+            if start:
+                self.pending.add(path)
+        finally:
+            self.lock.release()
+        if start:
+            if listing is not None:
+                callback = None  # Serve the old listing and refresh quietly.
+            worker = threading.Thread(target=self.refresh, args=(path, callback))
+            worker.daemon = True
+            worker.start()
+        if listing is None:
+            return None
+        return listing[1], listing[2]
+
+
+directory_listings = DirectoryListingCache()
+
+
 class OrgmodeLinkCompletions(sublime_plugin.EventListener):
 
+    def complete_again(self, view, location):
+        sels = view.sel()
+        if len(sels) and sels[0].end() == location:
+            view.run_command('auto_complete', {'disable_auto_insert': True})
+
     def on_query_completions(self, view, prefix, locations):
-        import os
-        from glob import glob
         # print 'view =', view
         # print 'preifx =', prefix
         # print 'locations =', locations
@@ -336,21 +663,25 @@ class OrgmodeLinkCompletions(sublime_plugin.EventListener):
         # print 'split =', repr(path), repr(base)
         if not len(path):
             path = os.path.dirname(view.file_name())
-        if not os.path.exists(path):
+        if not os.path.isabs(path):
             path = os.path.join(os.path.dirname(view.file_name()), path)
         # print 'path =', path, base
-        pattern = os.path.join(path, '%s*' % base)
-        # print 'pattern =', pattern
-        files = glob(pattern)
-        basename = os.path.basename
-        isdir = os.path.isdir
-        for pos, item in enumerate(files[:]):
-            expr = basename(item)
-            snippet = basename(item)
-            if isdir(item):
-                expr += '/'
-                snippet += '/'
-            files[pos] = (expr, snippet)
+        listing = directory_listings.get(path, lambda: self.complete_again(view, location))
+        if listing is None:
+            return []
+        names, is_dirs = listing
+        settings = sublime.load_settings('Global.sublime-settings')
+        max_results = settings.get('orgmode.link_completion.max_results', DEFAULT_LINK_COMPLETION_MAX_RESULTS)
+        hidden = base.startswith('.')
+        files = []
+        pos = bisect_left(names, base)
+        while pos < len(names) and names[pos].startswith(base) and len(files) < max_results:
+            name = names[pos]
+            if hidden or not name.startswith('.'):
+                if is_dirs[pos]:
+                    name += '/'
+                files.append((name, name))
+            pos += 1
         # print 'files =', files
         if not files:
             return [(base + '/', base)]
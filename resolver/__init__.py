@@ -0,0 +1,165 @@
+'''
+Registry of link resolvers.
+
+Resolver modules in this package are discovered once and only imported on
+first use. Other packages can add their own resolvers via register(), e.g.:
+
+    import resolver
+    resolver.register('redmine', 'my_package.redmine_resolver')
+
+The registered module has to provide a Resolver class.
+
+Resolver instances are shared by all views. They are pooled by the values
+of the settings they depend on and get rebuilt once one of them changes.
+'''
+
+import os
+import time
+import json
+
+import sublime
+
+
+IGNORED_MODULES = ('__init__', 'abstract')
+
+registered_resolvers = dict()  # name -> module path or module
+loaded_resolvers = dict()  # name -> module
+discovered = False
+debug_hook = None
+
+resolver_pool = dict()  # (name, settings values) -> resolver
+pool_keys = dict()  # name -> current key into resolver_pool
+dispatchers = dict()  # tuple of pool keys -> Dispatcher
+settings = None
+
+
+def set_debug_hook(hook):
+    global debug_hook
+    debug_hook = hook
+
+
+def debug(message, *args):
+    if debug_hook is not None:
+        debug_hook(message % args)
+
+
+def register(name, module):
+    registered_resolvers[name] = module
+    loaded_resolvers.pop(name, None)
+    pool_keys.pop(name, None)
+
+
+def discover():
+    global discovered
+    if discovered:
+        return
+    start = time.time()
+    path = os.path.dirname(os.path.abspath(__file__))
+    for filename in os.listdir(path):
+        name, ext = os.path.splitext(filename)
+        if ext != '.py' or name in IGNORED_MODULES:
+            continue
+        registered_resolvers.setdefault(name, '%s.%s' % (__name__, name))
+    discovered = True
+    debug('Discovered %d link resolvers in %.2f ms.',
+          len(registered_resolvers), (time.time() - start) * 1000)
+
+
+def load(name):
+    module = loaded_resolvers.get(name)
+    if module is not None:
+        return module
+    discover()
+    try:
+        module = registered_resolvers[name]
+    except KeyError:
+        raise KeyError('Unknown link resolver: %s' % name)
+    if isinstance(module, basestring):
+        start = time.time()
+        module = __import__(module, globals(), locals(), [module.split('.')[-1]])
+        debug('Loaded link resolver %s in %.2f ms.', name, (time.time() - start) * 1000)
+    loaded_resolvers[name] = module
+    return module
+
+
+def on_settings_changed():
+    # Keys are recalculated on next use. Resolvers whose settings did not
+    # change are found again under the same key.
+    pool_keys.clear()
+
+
+def get_settings():
+    global settings
+    if settings is None:
+        settings = sublime.load_settings('Global.sublime-settings')
+        settings.add_on_change('orgmode.open_link.resolver', on_settings_changed)
+    return settings
+
+
+def get_pool_key(name):
+    key = pool_keys.get(name)
+    if key is None:
+        get = get_settings().get
+        Resolver = load(name).Resolver
+        values = tuple(json.dumps(get(setting), sort_keys=True)
+                       for setting in Resolver.settings_keys)
+        key = pool_keys[name] = (name, values)
+    return key
+
+
+def get_resolver(name):
+    key = get_pool_key(name)
+    resolver = resolver_pool.get(key)
+    if resolver is None:
+        for old_key in [old_key for old_key in resolver_pool if old_key[0] == name]:
+            del resolver_pool[old_key]
+        resolver = resolver_pool[key] = load(name).Resolver()
+    return resolver
+
+
+def get_dispatcher(names):
+    key = tuple(get_pool_key(name) for name in names)
+    dispatcher = dispatchers.get(key)
+    if dispatcher is None:
+        start = time.time()
+        dispatchers.clear()  # Only keep the current one around.
+        dispatcher = dispatchers[key] = Dispatcher([get_resolver(name) for name in names])
+        debug('Initialized %d link resolvers in %.2f ms.',
+              len(names), (time.time() - start) * 1000)
+    return dispatcher
+
+
+class Dispatcher(object):
+    '''Dispatch links to resolvers by their scheme instead of asking every
+    resolver in turn. Resolvers without known schemes (e.g. local_file) are
+    asked for every link, keeping the configured order.'''
+
+    def __init__(self, resolvers):
+        self.resolvers = resolvers
+        self.fallbacks = []
+        keyed = dict()
+        for pos, resolver in enumerate(resolvers):
+            schemes = resolver.get_schemes()
+            if schemes is None:
+                self.fallbacks.append((pos, resolver))
+                continue
+            for scheme in schemes:
+                keyed.setdefault(scheme, []).append((pos, resolver))
+        self.schemes = dict()
+        for scheme, candidates in keyed.iteritems():
+            candidates = sorted(candidates + self.fallbacks)
+            self.schemes[scheme] = [resolver for pos, resolver in candidates]
+        self.fallbacks = [resolver for pos, resolver in self.fallbacks]
+
+    def candidates(self, content):
+        pos = content.find(':')
+        if pos > 0:
+            return self.schemes.get(content[:pos], self.fallbacks)
+        return self.fallbacks
+
+    def resolve(self, content, view):
+        for resolver in self.candidates(content):
+            result = resolver.resolve(content, view)
+            if result is not None:
+                return resolver, result
+        return None, None
@@ -2,14 +2,30 @@
 Settings in Global.sublime-settings are:
 - orgmode.open_link.resolver.abstract.commands: See DEFAULT_OPEN_LINK_COMMANDS.
 - orgmode.open_link.resolver.abstract.arg_list_wrapper: Optional wrapper for e.g. virtualenv.
+- orgmode.open_link.resolver.abstract.async: Run link openers in the background (default: true).
+- orgmode.open_link.resolver.abstract.max_concurrent: See DEFAULT_MAX_CONCURRENT.
+- orgmode.open_link.resolver.abstract.max_args: See DEFAULT_OPEN_LINK_MAX_ARGS.
 '''
 
+import re
 import sys
+import threading
 import subprocess
+from collections import deque
+from functools import partial
 
 import sublime
 
 
+COMMANDS_SETTING = 'orgmode.open_link.resolver.abstract.commands'
+ARG_LIST_WRAPPER_SETTING = 'orgmode.open_link.resolver.abstract.arg_list_wrapper'
+ASYNC_SETTING = 'orgmode.open_link.resolver.abstract.async'
+MAX_CONCURRENT_SETTING = 'orgmode.open_link.resolver.abstract.max_concurrent'
+MAX_ARGS_SETTING = 'orgmode.open_link.resolver.abstract.max_args'
+
+# Max number of link openers running at the same time.
+DEFAULT_MAX_CONCURRENT = 4
+
 DEFAULT_OPEN_LINK_COMMANDS = dict(
     # Standard universal can opener for OSX.
     darwin=['open'],
@@ -23,14 +39,104 @@ DEFAULT_OPEN_LINK_COMMANDS = dict(
     # linux= FIXME ???
 )
 
+# Max number of links handed over to one opener call when opening many links.
+DEFAULT_OPEN_LINK_MAX_ARGS = dict(
+    # open accepts any number of files and URLs.
+    darwin=50,
+
+    # start only opens one thing at a time.
+    win32=1,
+)
+
+
+compiled_patterns = dict()
+
+
+def compile_pattern(pattern):
+    regex = compiled_patterns.get(pattern)
+    if regex is None:
+        regex = compiled_patterns[pattern] = re.compile(pattern)
+    return regex
+
+
+def run_opener(cmd):
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return process.communicate()
+
+
+def report_opener_output(stdout, stderr):
+    if stdout:
+        stdout = unicode(stdout, 'utf-8')
+        sublime.status_message(stdout)
+    if stderr:
+        stderr = unicode(stderr, 'utf-8')
+        sublime.error_message(stderr)
+
+
+class OpenerPool(object):
+    '''Runs link openers on worker threads. Up to max_concurrent workers are
+    started on demand and quit once there is nothing left to do. Output is
+    reported back on the main thread.'''
+
+    def __init__(self):
+        self.jobs = deque()
+        self.lock = threading.Lock()
+        self.num_workers = 0
+
+    def submit(self, cmd, max_concurrent):
+        self.lock.acquire()
+        try:
+            self.jobs.append(cmd)
+            if self.num_workers >= max(max_concurrent, 1):
+                return
+            self.num_workers += 1
+        finally:
+            self.lock.release()
+        worker = threading.Thread(target=self.work)
+        worker.daemon = True
+        worker.start()
+
+    def work(self):
+        while True:
+            self.lock.acquire()
+            try:
+                if not self.jobs:
+                    self.num_workers -= 1
+                    return
+                cmd = self.jobs.popleft()
+            finally:
+                self.lock.release()
+            try:
+                stdout, stderr = run_opener(cmd)
+            except OSError, excp:
+                stdout, stderr = '', str(excp)
+            sublime.set_timeout(partial(report_opener_output, stdout, stderr), 0)
+
+
+opener_pool = OpenerPool()
+
 
 class AbstractLinkResolver(object):
+    '''Resolvers are shared between all views (see resolver.get_resolver).
+    Everything view specific has to be passed in.'''
 
-    def __init__(self, view):
+    # Settings this resolver depends on. Instances are rebuilt if they change.
+    settings_keys = (COMMANDS_SETTING, ARG_LIST_WRAPPER_SETTING,
+                     ASYNC_SETTING, MAX_CONCURRENT_SETTING, MAX_ARGS_SETTING)
+
+    def __init__(self):
         super(AbstractLinkResolver, self).__init__()
-        self.view = view
         self.settings = sublime.load_settings('Global.sublime-settings')
-        self.link_commands = self.settings.get('orgmode.open_link.resolver.abstract.commands', DEFAULT_OPEN_LINK_COMMANDS)
+        self.link_commands = self.settings.get(COMMANDS_SETTING, DEFAULT_OPEN_LINK_COMMANDS)
+        self.arg_list_wrapper = self.settings.get(ARG_LIST_WRAPPER_SETTING, [])
+        self.run_async = self.settings.get(ASYNC_SETTING, True)
+        self.max_concurrent = self.settings.get(MAX_CONCURRENT_SETTING, DEFAULT_MAX_CONCURRENT)
+        self.max_args = self.settings.get(MAX_ARGS_SETTING, DEFAULT_OPEN_LINK_MAX_ARGS)
+
+    def get_schemes(self):
+        '''Return the link schemes (the part before ":") handled by this
+        resolver or None if it has to be asked for every link.'''
+        return None
 
     def extract(self, content):
         return content
@@ -38,7 +144,7 @@ class AbstractLinkResolver(object):
     def replace(self, content):
         return content
 
-    def resolve(self, content):
+    def resolve(self, content, view):
         match = self.extract(content)
         if not match:
             return None
@@ -51,40 +157,67 @@ class AbstractLinkResolver(object):
                 return val
         return None
 
-    def execute(self, content):
+    def get_max_args(self):
+        if self.arg_list_wrapper:
+            return 1  # The wrapper gets the whole command as one argument.
+        platform = sys.platform
+        for key, val in self.max_args.iteritems():
+            if key in platform:
+                return max(val, 1)
+        return 1
+
+    def build_command(self, contents, view):
         command = self.get_link_command()
         if not command:
             sublime.error_message('Could not get link opener command.\nPlatform not yet supported.')
 
-        content = '"%s"' % content.encode('utf-8')
-        cmd = command + [content]
-        arg_list_wrapper = self.settings.get("orgmode.open_link.resolver.abstract.arg_list_wrapper", [])
+        contents = ['"%s"' % content.encode('utf-8') for content in contents]
+        cmd = command + contents
+        arg_list_wrapper = self.arg_list_wrapper
         if arg_list_wrapper:  # NOTE never use shell=True below.
             cmd = arg_list_wrapper + [' '.join(cmd)]
-            source_filename = self.view.file_name()
+            source_filename = view.file_name()
             cmd += ['--origin', source_filename, '--quiet']
-        # print '*****'
-        # print repr(content), content
         # print repr(cmd)
-        # print cmd
+        return cmd
+
+    def launch(self, cmd):
         sublime.status_message('Executing: %s' % cmd)
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = process.communicate()
-        if stdout:
-            stdout = unicode(stdout, 'utf-8')
-            sublime.status_message(stdout)
-        if stderr:
-            stderr = unicode(stderr, 'utf-8')
-            sublime.error_message(stderr)
+        if self.run_async:
+            opener_pool.submit(cmd, self.max_concurrent)
+        else:
+            stdout, stderr = run_opener(cmd)
+            report_opener_output(stdout, stderr)
 
+    def execute(self, content, view):
+        self.launch(self.build_command([content], view))
+
+    def execute_many(self, contents, view):
+        '''Open all contents with as few opener calls as the platform allows.'''
+        max_args = self.get_max_args()
+        for pos in xrange(0, len(contents), max_args):
+            self.launch(self.build_command(contents[pos:pos + max_args], view))
+
+
+# Matches patterns starting with an alternation of schemes, e.g.
+# ^(jira|j):... or ^(?P<type>email|mailto):...
+SCHEMES_REGEX = re.compile(r'^\^\((?:\?P<\w+>)?([\w.+-]+(?:\|[\w.+-]+)*)\):')
 
 
 class AbstractRegexLinkResolver(AbstractLinkResolver):
 
-    def __init__(self, view):
-        super(AbstractRegexLinkResolver, self).__init__(view)
+    def __init__(self):
+        super(AbstractRegexLinkResolver, self).__init__()
         self.regex = None
 
+    def get_schemes(self):
+        if self.regex is None:
+            return None
+        match = SCHEMES_REGEX.match(self.regex.pattern)
+        if not match:
+            return None
+        return match.group(1).split('|')
+
     def extract(self, content):
         if self.regex is None:
             return content
@@ -4,9 +4,7 @@ Settings in Global.sublime-settings are:
 - orgmode.open_link.resolver.email.url: See URL_DEFAULT.
 '''
 
-import re
-
-from abstract import AbstractRegexLinkResolver
+from abstract import AbstractRegexLinkResolver, compile_pattern
 
 
 PATTERN_SETTING = 'orgmode.open_link.resolver.email.pattern'
@@ -17,11 +15,13 @@ URL_DEFAULT = 'mailto:%s'
 
 class Resolver(AbstractRegexLinkResolver):
 
-    def __init__(self, view):
-        super(Resolver, self).__init__(view)
+    settings_keys = AbstractRegexLinkResolver.settings_keys + (PATTERN_SETTING, URL_SETTING)
+
+    def __init__(self):
+        super(Resolver, self).__init__()
         get = self.settings.get
         pattern = get(PATTERN_SETTING, PATTERN_DEFAULT)
-        self.regex = re.compile(pattern)
+        self.regex = compile_pattern(pattern)
         self.url = get(URL_SETTING, URL_DEFAULT)
 
     def replace(self, match):
@@ -35,11 +35,11 @@ class Resolver(AbstractRegexLinkResolver):
         if match['type'] == 'email':
             return dict(email=match['email'], path=match['subject'])
 
-    def execute(self, content):
+    def execute(self, content, view):
         if type(content) is dict and 'email' in content:
             import sublime
             # TODO Implement email opener here.
             sublime.error_message('Email opener not implemented yet.')
             raise NotImplemented()
         else:
-            return super(Resolver, self).execute(content)
+            return super(Resolver, self).execute(content, view)
@@ -4,9 +4,7 @@ Settings in Global.sublime-settings are:
 - orgmode.open_link.resolver.jira.url: See URL_DEFAULT.
 '''
 
-import re
-
-from abstract import AbstractRegexLinkResolver
+from abstract import AbstractRegexLinkResolver, compile_pattern
 
 
 PATTERN_SETTING = 'orgmode.open_link.resolver.jira.pattern'
@@ -17,11 +15,13 @@ URL_DEFAULT = 'http://sandbox.onjira.com/browse/%s'
 
 class Resolver(AbstractRegexLinkResolver):
 
-    def __init__(self, view):
-        super(Resolver, self).__init__(view)
+    settings_keys = AbstractRegexLinkResolver.settings_keys + (PATTERN_SETTING, URL_SETTING)
+
+    def __init__(self):
+        super(Resolver, self).__init__()
         get = self.settings.get
         pattern = get(PATTERN_SETTING, PATTERN_DEFAULT)
-        self.regex = re.compile(pattern)
+        self.regex = compile_pattern(pattern)
         self.url = get(URL_SETTING, URL_DEFAULT)
 
     def replace(self, match):
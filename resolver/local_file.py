@@ -2,15 +2,17 @@
 Settings in Global.sublime-settings are:
 - orgmode.open_link.resolver.local_file.pattern: See PATTERN_DEFAULT.
 - orgmode.open_link.resolver.local_file.force_into_sublime: See FORCE_LOAD_DEFAULT.
+- orgmode.open_link.resolver.local_file.cache_ttl: See CACHE_TTL_DEFAULT.
 '''
 
-import re
 import os
-from fnmatch import fnmatch
+import re
+import time
+from fnmatch import translate
 
 import sublime
 
-from abstract import AbstractLinkResolver
+from abstract import AbstractLinkResolver, compile_pattern
 
 
 PATTERN_SETTING = 'orgmode.open_link.resolver.local_file.pattern'
@@ -19,70 +21,132 @@ PATTERN_DEFAULT = r'^(?P<filepath>.+?)(?::(?P<row>\d+)(?::(?P<col>\d+))?)?$'
 FORCE_LOAD_SETTING = 'orgmode.open_link.resolver.local_file.force_into_sublime'
 FORCE_LOAD_DEFAULT = ['*.txt', '*.org', '*.py', '*.rb', '*.html', '*.css', '*.js', '*.php', '*.c', '*.cpp', '*.h']
 
+# Seconds a resolved path is remembered before the file system is asked again.
+CACHE_TTL_SETTING = 'orgmode.open_link.resolver.local_file.cache_ttl'
+CACHE_TTL_DEFAULT = 10
+CACHE_SIZE = 256
+
+
+def compile_globs(patterns):
+    '''Compile a list of glob patterns into one regex (None if empty).'''
+    if not patterns:
+        return None
+    flags = re.IGNORECASE if os.path.normcase('A') == 'a' else 0
+    return re.compile('|'.join('(?:%s)' % translate(pattern) for pattern in patterns), flags)
+
+
+class PathCache(object):
+    '''Bounded cache whose entries expire after ttl seconds. Once full the
+    least recently used half of the entries is dropped in one go.'''
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = dict()  # key -> [expires, last_used, value]
+        self.counter = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self.entries[key]
+            return None
+        self.counter += 1
+        entry[1] = self.counter
+        return entry[2]
+
+    def set(self, key, value):
+        if key not in self.entries and len(self.entries) >= self.max_size:
+            self.evict()
+        self.counter += 1
+        self.entries[key] = [time.time() + self.ttl, self.counter, value]
+
+    def evict(self):
+        entries = sorted(self.entries.iteritems(), key=lambda item: item[1][1])
+        for key, entry in entries[:len(entries) // 2 + 1]:
+            del self.entries[key]
+
 
 class Resolver(AbstractLinkResolver):
     '''
     @todo: If the link is a local org-file open it directly via sublime, otherwise use OPEN_LINK_COMMAND.
     '''
 
-    def __init__(self, view):
-        super(Resolver, self).__init__(view)
+    settings_keys = AbstractLinkResolver.settings_keys + (
+        PATTERN_SETTING, FORCE_LOAD_SETTING, CACHE_TTL_SETTING,
+        'folder_exclude_patterns', 'file_exclude_patterns')
+
+    def __init__(self):
+        super(Resolver, self).__init__()
         get = self.settings.get
         pattern = get(PATTERN_SETTING, PATTERN_DEFAULT)
-        self.regex = re.compile(pattern)
-        self.force_load_patterns = get(FORCE_LOAD_SETTING, FORCE_LOAD_DEFAULT)
+        self.regex = compile_pattern(pattern)
+        self.force_load_regex = compile_globs(get(FORCE_LOAD_SETTING, FORCE_LOAD_DEFAULT))
+        self.folder_exclude_patterns = set(get('folder_exclude_patterns') or [])
+        self.file_exclude_regex = compile_globs(get('file_exclude_patterns'))
+        self.cache = PathCache(CACHE_SIZE, get(CACHE_TTL_SETTING, CACHE_TTL_DEFAULT))
 
     def file_is_excluded(self, filepath):
         basename = os.path.basename(filepath)
-        for pattern in self.force_load_patterns:
-            if fnmatch(basename, pattern):
-                # print 'found in force_load_patterns'
-                return False
-        folder_exclude_patterns = self.settings.get('folder_exclude_patterns')
-        if basename in folder_exclude_patterns:
+        if self.force_load_regex and self.force_load_regex.match(basename):
+            # print 'found in force_load_patterns'
+            return False
+        if basename in self.folder_exclude_patterns:
             # print 'found in folder_exclude_patterns'
             return True
-        file_exclude_patterns = self.settings.get('file_exclude_patterns')
-        for pattern in file_exclude_patterns:
-            if fnmatch(basename, pattern):
-                # print 'found in file_exclude_patterns'
-                return True
+        if self.file_exclude_regex and self.file_exclude_regex.match(basename):
+            # print 'found in file_exclude_patterns'
+            return True
         return False
 
-    def expand_path(self, filepath):
-        filepath = os.path.expandvars(filepath)
-        filepath = os.path.expanduser(filepath)
-
-        # print filepath
-        match = self.regex.match(filepath)
-        if match:
-            filepath, row, col = match.group('filepath'), match.group('row'), match.group('col')
-            # print filepath, row, col
-        else:
-            row = None
-            col = None
-
+    def lookup_path(self, filepath, cwd):
+        '''Returns the expanded filepath and whether it should be opened
+        within sublime.'''
         drive, filepath = os.path.splitdrive(filepath)
         if not filepath.startswith('/'):  # If filepath is relative...
-            cwd = os.path.dirname(self.view.file_name())
             testfile = os.path.join(cwd, filepath)
             if os.path.exists(testfile):  # See if it exists here...
                 filepath = testfile
         filepath = ':'.join([drive, filepath]) if drive else filepath
-
-        if os.path.exists(filepath) and not self.file_is_excluded(filepath):
+        in_sublime = os.path.exists(filepath) and not self.file_is_excluded(filepath)
+        return filepath, in_sublime
+
+    def expand_path(self, filepath, view):
+        cwd = os.path.dirname(view.file_name())
+        key = (cwd, filepath)
+        result = self.cache.get(key)
+        if result is None:
+            filepath = os.path.expandvars(filepath)
+            filepath = os.path.expanduser(filepath)
+
+            # print filepath
+            match = self.regex.match(filepath)
+            if match:
+                filepath, row, col = match.group('filepath'), match.group('row'), match.group('col')
+                # print filepath, row, col
+            else:
+                row = None
+                col = None
+            filepath, in_sublime = self.lookup_path(filepath, cwd)
+            result = (filepath, row, col, in_sublime)
+            self.cache.set(key, result)
+        filepath, row, col, in_sublime = result
+
+        if in_sublime:
             if row: filepath += ':%s' % row
             if col: filepath += ':%s' % col
-            self.view.window().open_file(filepath, sublime.ENCODED_POSITION)
+            view.window().open_file(filepath, sublime.ENCODED_POSITION)
             return True
 
         return filepath
 
-    def replace(self, content):
-        content = self.expand_path(content)
-        return content
+    def resolve(self, content, view):
+        if not content:
+            return None
+        return self.expand_path(content, view)
 
-    def execute(self, content):
+    def execute(self, content, view):
         if content is not True:
             # print 'normal open'
-            return super(Resolver, self).execute(content)
+            return super(Resolver, self).execute(content, view)
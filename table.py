@@ -12,8 +12,13 @@
 # TODO Hitting backspace at the end of a table should not delete the bottom right corner.
 # TODO Having two tables right below each other should not merge them.
 
+import json
 import os
+import re
 import textwrap
+import time
+import unicodedata
+from bisect import bisect_right
 
 # Uses asciitable for interpreting data.
 # http://pypi.python.org/pypi/asciitable
@@ -60,6 +65,43 @@ LINE_H_BR_NORM = u'╯'  # Horizontal bottom right edge.
 # End: Normal table elements.
 
 
+# Display width of characters outside ASCII, filled on demand.
+char_widths = dict()
+NON_ASCII_REGEX = re.compile(u'[^\x00-\x7f]')
+
+
+def char_width(char):
+    width = char_widths.get(char)
+    if width is None:
+        if unicodedata.combining(char) or unicodedata.category(char) in ('Mn', 'Me', 'Cf'):
+            width = 0
+        elif unicodedata.east_asian_width(char) in ('W', 'F'):
+            width = 2
+        elif u'\ud800' <= char <= u'\udbff':  # Astral char on narrow builds.
+            width = 2
+        elif u'\udc00' <= char <= u'\udfff':
+            width = 0
+        else:
+            width = 1
+        char_widths[char] = width
+    return width
+
+
+def text_width(text):
+    """Number of columns ``text`` takes up in a monospaced font. CJK and
+    other wide chars take two, combining marks none."""
+    wide = NON_ASCII_REGEX.findall(text)
+    if not wide:
+        return len(text)
+    return len(text) - len(wide) + sum([char_width(char) for char in wide])
+
+
+def to_text(value):
+    if isinstance(value, unicode):
+        return value
+    return str(value).decode('utf8')
+
+
 class Table(object):
 
     def __init__(self):
@@ -67,22 +109,84 @@ class Table(object):
         self.num_rows = 0
         self.num_cols = 0
         self.cols = []
+        self.cells = []
+        self.widths = []
         self.headers = None
 
+    def analyze_row(self, row):
+        """Split every cell of ``row`` into its lines. Returns the cells and
+        their widths including padding."""
+        padding = len(LINE_V_NORM_PADDING % '')
+        row_cells = []
+        row_widths = []
+        for col in row:
+            if not isinstance(col, unicode):
+                col = str(col).decode('utf8')
+            if u'\n' in col:
+                parts = [(part, text_width(part)) for part in col.split(u'\n')]
+                width = max([part[1] for part in parts]) + padding
+            else:
+                parts = [(col, text_width(col))]
+                width = parts[0][1] + padding
+            row_cells.append(parts)
+            row_widths.append(width)
+        return row_cells, row_widths
+
     def analyze(self):
-        rows = 0
+        # Split every cell into its lines once. Drawing works on these.
         cols = []
+        cells = []
+        widths = []
         for row in self.data:
-            rows += 1
-            for num, col in enumerate(row):
+            row_cells, row_widths = self.analyze_row(row)
+            for num, width in enumerate(row_widths):
                 if len(cols) <= num:
-                    cols.append(0)
-                for part in str(col).decode('utf8').split('\n'):
-                    # print '1.', repr(part)
-                    cols[num] = max(cols[num], len(part) + 2)
-        self.num_rows = rows
+                    cols.append(width)
+                elif cols[num] < width:
+                    cols[num] = width
+            cells.append(row_cells)
+            widths.append(row_widths)
+        self.num_rows = len(cells)
         self.num_cols = len(cols)
         self.cols = cols
+        self.cells = cells
+        self.widths = widths
+
+    def update_row(self, num, row):
+        """Replace row ``num`` of an analyzed table. Returns whether any
+        column width changed and the table has to be drawn again."""
+        row_cells, row_widths = self.analyze_row(row)
+        old_widths = self.widths[num]
+        self.data[num] = row
+        self.cells[num] = row_cells
+        self.widths[num] = row_widths
+        changed = False
+        cols = self.cols
+        for pos, width in enumerate(row_widths):
+            if width > cols[pos]:
+                cols[pos] = width
+                changed = True
+            elif width < cols[pos] and old_widths[pos] == cols[pos]:
+                # The widest cell got smaller, look for the next widest.
+                cols[pos] = max([widths[pos] for widths in self.widths if len(widths) > pos])
+                changed = changed or cols[pos] != old_widths[pos]
+        return changed
+
+    def row_height(self, num):
+        cells = self.cells[num]
+        return max([len(parts) for parts in cells]) if cells else 0
+
+    def row_positions(self):
+        """Returns the line number each body row starts at."""
+        if self.headers:
+            pos = 2 + max([len(to_text(name).split('\n')) for name in self.headers.names])
+        else:
+            pos = 1
+        positions = []
+        for num in xrange(len(self.cells)):
+            positions.append(pos)
+            pos += self.row_height(num) + 1
+        return positions
 
     def set_header(self, data):
         self.headers = data
@@ -118,24 +222,35 @@ class Table(object):
         )
         return content
 
-    def draw_data(self, cols, line_v_norm_padding, line_v_norm_value,
+    def draw_data(self, content, rows, separator, line_v_norm_padding,
                   line_v_norm, line_v_l_norm, line_v_r_norm):
-        padding_width = len(line_v_norm_padding % '')
-        template = line_v_norm_padding % line_v_norm_value
-        # Gather col data and pad by length of each column.
-        row = []
-        for pos, width in enumerate(self.cols):
-            pattern = template % (width - padding_width)
-            try:
-                value = pattern % unicode(cols[pos], 'utf8')
-            except IndexError:
-                value = ' ' * (width - padding_width)
-                value = pattern % value
-            row.append(value)
-        # Join row together.
-        row = line_v_norm.join(row)
-        # Add edges and return it.
-        return line_v_l_norm + row + line_v_r_norm
+        # Build the pieces every line consists of once.
+        pad_left, pad_right = line_v_norm_padding.split('%s')
+        left = line_v_l_norm + pad_left
+        join = (pad_right + line_v_norm + pad_left).join
+        right = pad_right + line_v_r_norm
+        padding = len(pad_left) + len(pad_right)
+        widths = [width - padding for width in self.cols]
+        blanks = [u' ' * width for width in widths]
+        append = content.append
+        num_cols = len(widths)
+        for num, cells in enumerate(rows):
+            if num and separator is not None:
+                append(separator)
+            height = max([len(parts) for parts in cells]) if cells else 0
+            if height == 1 and len(cells) == num_cols:
+                # Fast path for the common case of single line cells.
+                values = [parts[0][0] + u' ' * (width - parts[0][1])
+                          for parts, width in zip(cells, widths)]
+                append(left + join(values) + right)
+                continue
+            for line in xrange(height):
+                values = blanks[:]
+                for pos, parts in enumerate(cells):
+                    if line < len(parts):
+                        part, part_width = parts[line]
+                        values[pos] = part + u' ' * (widths[pos] - part_width)
+                append(left + join(values) + right)
 
     def draw_join(self, line_h_norm, line_h_c_norm, line_h_l_norm,
                   line_h_r_norm):
@@ -146,27 +261,27 @@ class Table(object):
         # Add edges and return it.
         return line_h_l_norm + row + line_h_r_norm
 
-    def draw_header_data(self, cols):
-        content = self.draw_data(
-            cols,
+    def draw_header_data(self, content, rows):
+        self.draw_data(
+            content,
+            rows,
+            None,
             LINE_V_HEAD_PADDING,
-            LINE_V_HEAD_VALUE,
             LINE_V_HEAD,
             LINE_V_L_HEAD,
             LINE_V_R_HEAD,
         )
-        return content
 
-    def draw_body_data(self, cols):
-        content = self.draw_data(
-            cols,
+    def draw_body_data(self, content, rows):
+        self.draw_data(
+            content,
+            rows,
+            self.draw_body_join(),
             LINE_V_NORM_PADDING,
-            LINE_V_NORM_VALUE,
             LINE_V_NORM,
             LINE_V_L_NORM,
             LINE_V_R_NORM,
         )
-        return content
 
     def draw_header_join(self):
         content = self.draw_join(
@@ -194,66 +309,54 @@ class Table(object):
         # Add edges and return it.
         return LINE_H_BL_NORM + row + LINE_H_BR_NORM
 
-    def draw(self):
-        self.analyze()
+    def draw_lines(self):
         # print self.num_rows, self.num_cols, self.cols
         content = []
         if self.headers:
-            row = self.headers.names
+            row = [[(part, text_width(part)) for part in to_text(name).split('\n')]
+                   for name in self.headers.names]
             content.append(self.draw_header_header())
-            content.append(self.draw_header_data(row))
+            self.draw_header_data(content, [row])
             content.append(self.draw_header_join())
         else:
             content.append(self.draw_body_header())
-        for row in self.data:
-            lines = []
-            for pos, col in enumerate(row):
-                parts = str(col).split('\n')
-                for row_, part in enumerate(parts):
-                    if len(lines) - 1 < row_:
-                        lines.append([])
-                    while len(lines[row_]) - 1 < pos:
-                        lines[row_].append('')
-                        # print cur, len(lines[row_]), pos
-                    lines[row_][pos] = part
-            # print 'lines =', lines
-            for line in lines:
-                content.append(self.draw_body_data(line))
-            content.append(self.draw_body_join())
-        if self.data:
-            content.pop()
+        self.draw_body_data(content, self.cells)
         content.append(self.draw_body_footer())
-        content = '\n'.join(content)
+        return content
+
+    def draw_row_lines(self, num):
+        content = []
+        self.draw_body_data(content, [self.cells[num]])
+        return content
+
+    def draw(self):
+        self.analyze()
+        content = u'\n'.join(self.draw_lines())
         return content
 
 
 class ClipboardInputter(asciitable.BaseInputter):
 
+    # Quotes toggle the quoting state, newlines end a line outside of quotes.
+    split_regex = re.compile(r'["\'\n]')
+
     def split(self, content):
-        lines = []
-        quotechars = ['"', '\'']
+        """Yield the lines of ``content`` in one pass. Newlines within quotes
+        don't end a line."""
+        if not content:
+            return
         if content[-1] != '\n':
             content += '\n'
-        while len(content):
-            quotechar = None
-            # print 'content part =', repr(content), len(content)
-            for pos in range(0, len(content)):
-                char = content[pos]
-                if char in quotechars:
-                    if quotechar is None:
-                        quotechar = char
-                    else:
-                        quotechar = None
-                if not quotechar and char == '\n':
-                    part = content[:pos]
-                    content = content[pos + 1:]
-                    lines.append(part)
-                    break
-            if len(content) and quotechar:
-                lines.append(content)
-                content = ''
-        # print 'lines =', repr(lines)
-        return lines
+        quoted = False
+        start = 0
+        for match in self.split_regex.finditer(content):
+            if match.group() != '\n':
+                quoted = not quoted
+            elif not quoted:
+                yield content[start:match.start()]
+                start = match.end()
+        if start < len(content):
+            yield content[start:]
 
     def get_lines(self, table):
         """Get the lines from the ``table`` input.
@@ -264,7 +367,7 @@ class ClipboardInputter(asciitable.BaseInputter):
         try:
             # print '***', repr(table)
             if type(table) is not list:
-                lines = self.split(table)
+                lines = list(self.split(table))
             else:
                 lines = table
             # print '***', repr(lines)
@@ -281,6 +384,15 @@ class ClipboardInputter(asciitable.BaseInputter):
         return self.process_lines(lines)
 
 
+class StringOutputter(asciitable.BaseOutputter):
+    """Output the table as a list of rows holding the cell strings exactly as
+    they were read. Tables are only drawn, so converting cells to numbers
+    and back to strings would only cost time and change e.g. "007"."""
+
+    def __call__(self, cols):
+        return zip(*[col.str_vals for col in cols])
+
+
 class ClipboardSplitter(asciitable.DefaultSplitter):
     pass
     # def process_line(self, line):
@@ -289,6 +401,259 @@ class ClipboardSplitter(asciitable.DefaultSplitter):
     #     return line  # Do not strip whitespace.
 
 
+# Lines of a table and their line break. Matches an empty line at the end.
+LINE_REGEX = re.compile(u'([^\r\n]*)(\r\n|\r|\n|$)')
+
+JSON_SPACE_REGEX = re.compile(r'[ \t\n\r]*')
+# Tokens of JSON and the sloppy variants of it found in the wild.
+JSON_TOKEN_REGEX = re.compile(r'''\s*(?:
+    (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+  | (?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+  | (?P<word>[^\W\d]\w*)
+  | (?P<punct>[{}\[\]:,])
+)''', re.VERBOSE | re.UNICODE | re.DOTALL)
+JSON_ESCAPE_REGEX = re.compile(r'\\.|"', re.DOTALL)
+JSON_WORDS = dict(true=True, false=False, null=None, NaN=float('nan'),
+                  Infinity=float('inf'))
+
+
+class JsonObject(list):
+    '''Key value pairs of an object in the order they were found.'''
+    pass
+
+
+class LooseJsonParser(object):
+    '''Parses JSON in one pass. Also accepts single quoted strings, unquoted
+    keys and trailing commas. Nested objects become dicts, top level ones
+    JsonObjects.'''
+
+    def __init__(self, content):
+        self.decoder = json.JSONDecoder(strict=False)
+        self.tokens = self.tokenize(content)
+        self.next()
+
+    def tokenize(self, content):
+        match = JSON_TOKEN_REGEX.match
+        pos = 0
+        end = len(content)
+        while True:
+            token = match(content, pos)
+            if token is None:
+                break
+            pos = token.end()
+            kind = token.lastgroup
+            yield kind, token.group(kind), token.start(kind)
+        if content[pos:].strip():
+            pos = len(content) - len(content[pos:].lstrip())
+            raise ValueError('Unexpected %r at char %d' % (content[pos], pos))
+        yield None, None, end
+
+    def next(self):
+        self.kind, self.token, self.pos = self.tokens.next()
+
+    def fail(self):
+        if self.kind is None:
+            raise ValueError('Unexpected end of JSON')
+        raise ValueError('Unexpected %s at char %d' % (self.token, self.pos))
+
+    def expect(self, token):
+        if self.kind != 'punct' or self.token != token:
+            self.fail()
+        self.next()
+
+    def expect_end(self):
+        if self.kind is not None:
+            self.fail()
+
+    def decode_string(self, token):
+        if '\\' not in token:
+            return token[1:-1]
+        if token[0] == "'":
+            # Turn it into a double quoted string.
+            def escape(match):
+                char = match.group()
+                if char == '"':
+                    return '\\"'
+                if char == "\\'":
+                    return "'"
+                return char
+            token = '"%s"' % JSON_ESCAPE_REGEX.sub(escape, token[1:-1])
+        return self.decoder.decode(token)
+
+    def parse_key(self):
+        kind, token = self.kind, self.token
+        if kind == 'string':
+            key = self.decode_string(token)
+        elif kind in ('word', 'number'):
+            key = token  # Unquoted key.
+        else:
+            self.fail()
+        self.next()
+        return key
+
+    def parse_value(self, top=False):
+        kind, token = self.kind, self.token
+        if kind == 'punct' and token == '[':
+            return list(self.iter_array())
+        if kind == 'punct' and token == '{':
+            pairs = self.parse_object()
+            return JsonObject(pairs) if top else dict(pairs)
+        if kind == 'string':
+            value = self.decode_string(token)
+        elif kind == 'number':
+            if '.' in token or 'e' in token or 'E' in token:
+                value = float(token)
+            else:
+                value = int(token)
+        elif kind == 'word':
+            value = JSON_WORDS.get(token, token)
+        else:
+            self.fail()
+        self.next()
+        return value
+
+    def parse_object(self):
+        pairs = []
+        self.expect('{')
+        while not (self.kind == 'punct' and self.token == '}'):
+            key = self.parse_key()
+            self.expect(':')
+            pairs.append((key, self.parse_value()))
+            if self.kind == 'punct' and self.token == ',':
+                self.next()  # Trailing commas are fine too.
+            elif not (self.kind == 'punct' and self.token == '}'):
+                self.fail()
+        self.next()
+        return pairs
+
+    def iter_array(self, top=False):
+        """Yield the values of the array one at a time."""
+        self.expect('[')
+        while not (self.kind == 'punct' and self.token == ']'):
+            yield self.parse_value(top)
+            if self.kind == 'punct' and self.token == ',':
+                self.next()  # Trailing commas are fine too.
+            elif not (self.kind == 'punct' and self.token == ']'):
+                self.fail()
+        self.next()
+        if top:
+            self.expect_end()
+
+
+# Delimiters tried when pasting tables. On equal scores the first one wins.
+# Runs of spaces count as one delimiter, so that is only the last resort.
+DELIMITER_CANDIDATES = ['\t', ',', ':', ';', '|', ' ']
+# Spaces at the start or end of a line, stripped when splitting on spaces.
+EDGE_SPACES_REGEX = re.compile(r'^ +| +$', re.MULTILINE)
+# Number of non-blank lines looked at for choosing the delimiter.
+DELIMITER_SAMPLE_SIZE = 50
+
+
+class TableRegion(object):
+    '''Lines of one table within a view. Each line is known by its first
+    char: LINE_H_TL_NORM (header), LINE_H_L_NORM (separator), LINE_V_L_NORM
+    (data) or LINE_H_BL_NORM (footer).'''
+
+    def __init__(self, line_begin):
+        self.line_begin = line_begin  # Start of the header line.
+        self.begin = None  # Top left corner.
+        self.end = None
+        self.starts = []
+        self.lines = []
+        self.kinds = []
+
+    def add_line(self, start, line):
+        self.starts.append(start)
+        self.lines.append(line)
+        self.kinds.append(line.lstrip()[:1])
+
+    def find_line(self, point):
+        return bisect_right(self.starts, point) - 1
+
+    def find_content_point(self, point):
+        '''Returns the nearest point within a data cell or False.'''
+        kinds = self.kinds
+        last = len(kinds) - 1
+        num = self.find_line(point)
+        col = point - self.starts[num]
+        if kinds[num] == LINE_H_TL_NORM and num < last:
+            num += 1
+        if kinds[num] == LINE_H_L_NORM:
+            if num < last and kinds[num + 1] != LINE_H_L_NORM:
+                num += 1
+            elif num and kinds[num - 1] != LINE_H_L_NORM:
+                num -= 1
+        if kinds[num] == LINE_H_BL_NORM and num:
+            num -= 1
+        if kinds[num] != LINE_V_L_NORM:
+            return False
+        line = self.lines[num]
+        left = line.index(LINE_V_L_NORM) + 2  # Behind the left border.
+        right = line.rindex(LINE_V_R_NORM)
+        if right <= left:
+            return False
+        col = max(left, min(col, right - 1))
+        # Step from a column separator back into the cell before it.
+        bar = line.rfind(LINE_V_NORM, left, col + 1)
+        if bar >= 0 and col - bar < 2:
+            col = bar - 1
+        return self.starts[num] + col
+
+
+class TableIndex(object):
+    '''All tables of a view. Built on first use and dropped whenever the view
+    is modified. Tables and their lines are found by binary search.'''
+
+    def __init__(self, view):
+        self.tables = []
+        self.line_begins = []
+        for region in view.find_by_selector('orgmode.table.simple'):
+            self.add_region(view, region)
+
+    def add_region(self, view, region):
+        point = view.line(region.begin()).begin()
+        table = None
+        for line in view.substr(sublime.Region(point, region.end())).split(u'\n'):
+            if table is None:
+                if LINE_H_TL_NORM not in line:
+                    point += len(line) + 1
+                    continue
+                table = TableRegion(point)
+                table.begin = point + line.index(LINE_H_TL_NORM)
+                self.tables.append(table)
+                self.line_begins.append(point)
+            table.add_line(point, line)
+            point += len(line) + 1
+            if table.kinds[-1] == LINE_H_BL_NORM:
+                # Tables right below each other share one scope.
+                table.end = min(point, region.end())
+                table = None
+        if table is not None:
+            table.end = region.end()
+            if not table.lines[-1]:
+                del table.starts[-1], table.lines[-1], table.kinds[-1]
+
+    def find_table(self, point):
+        pos = bisect_right(self.line_begins, point) - 1
+        if pos < 0:
+            return None
+        table = self.tables[pos]
+        if point < table.end or (point == table.end and table.kinds[-1] != LINE_H_BL_NORM):
+            return table
+        return None
+
+
+# View id -> TableIndex.
+table_indexes = dict()
+
+
+def get_table_index(view):
+    index = table_indexes.get(view.id())
+    if index is None:
+        index = table_indexes[view.id()] = TableIndex(view)
+    return index
+
+
 class AbstractTableCommand(sublime_plugin.TextCommand):
 
     def dedent_content(self, content):
@@ -319,61 +684,104 @@ class AbstractTableCommand(sublime_plugin.TextCommand):
         curly = startswith('{') and endswith('}')
         return edgy or curly
 
-    def switch_quotes(self, content):
-        from string import maketrans
-        transtab = maketrans('"\'', '\'"')
-        # print 'transtab =', repr(transtab)
-        return content.encode('utf8').translate(transtab)
+    def json_items_to_rows(self, items):
+        """Lists become rows, objects too with the keys of all objects as
+        first row and anything else a row with a single cell."""
+        result = []
+        keys = []
+        known_keys = set()
+        for item in items:
+            if type(item) is list:
+                result.append([unicode(col) for col in item])
+            elif type(item) in (JsonObject, dict):
+                if type(item) is dict:
+                    item = item.iteritems()
+                row = dict()
+                for key, val in item:
+                    if key not in known_keys:
+                        known_keys.add(key)
+                        keys.append(key)
+                    row[key] = unicode(val)
+                result.append(row)
+            else:
+                result.append([unicode(item)])
+        if keys:
+            for pos, row in enumerate(result):
+                if type(row) is dict:
+                    result[pos] = [row.get(key, u'') for key in keys]
+            result.insert(0, [unicode(key) for key in keys])
+        if not result:
+            raise Exception('No rows found in JSON.')
+        return result
+
+    def iter_json_items(self, content):
+        """Yield the items of the JSON array ``content`` one by one without
+        decoding the whole array first."""
+        decoder = json.JSONDecoder()
+        space = JSON_SPACE_REGEX.match
+        pos = space(content, content.index('[') + 1).end()
+        if content[pos:pos + 1] != ']':
+            while True:
+                item, pos = decoder.raw_decode(content, idx=pos)
+                yield item
+                pos = space(content, pos).end()
+                if content[pos:pos + 1] == ']':
+                    break
+                if content[pos:pos + 1] != ',':
+                    raise ValueError('Expecting , delimiter: char %d' % pos)
+                pos = space(content, pos + 1).end()
+        if space(content, pos + 1).end() != len(content):
+            raise ValueError('Extra data: char %d' % (pos + 1))
 
     def convert_json_to_tabular(self, content):
         # print 'LOOKS LIKE JSON:', repr(content)
-        import json
-        import re
+        content = content.strip()
+        # Valid JSON is much faster with the decoder of the json module.
         try:
-            content = json.loads(content)
-        except ValueError, excp:
-            if str(excp).startswith('Expecting object'):
-                content = self.switch_quotes(content)
-                # print 'content =', content
-                try:
-                    content = json.loads(content)
-                except ValueError, excp:
-                    if str(excp).startswith('Expecting object'):
-                        pattern = r'.*\(char (?P<char>\d+)\)$'
-                        match = re.match(pattern, str(excp))
-                        # print match
-                        if match:
-                            pos = int(match.group('char'))
-                            pos -= 1
-                            # JSON doesn't like trailing commas so we try to
-                            # find and remove it. See if that helps...
-                            while pos >= 0 and content[pos] in (' ', '\t', '\n', '\r'):
-                                pos -= 1
-                            if content[pos] == ',':
-                                content = content[:pos] + content[pos + 1:]
-                                # print 'content =', content
-                                content = json.loads(content)
-            else:
-                raise
-        result = []
-        # Convert object into flat data.
-        if type(content) is list:
-            for item in content:
-                if type(item) is list:
-                    result.append([unicode(col) for col in item])
-                else:
-                    result.append([unicode(item)])
-        elif type(content) is dict:
-            for key, val in content.iteritems():
-                result.append([unicode(key), unicode(val)])
-        else:
-            raise Exception('Expected dict or list for JSON decoding.')
-        # Convert flat data into table.
-        for pos, row in enumerate(result):
-            result[pos] = '\t'.join(row)
-        result = '\n'.join(result)
-        # print 'result =', repr(result)
-        return result
+            if content.startswith('['):
+                return self.json_items_to_rows(self.iter_json_items(content))
+            data = json.loads(content)
+            if type(data) is dict:
+                return [[unicode(key), unicode(val)] for key, val in data.iteritems()]
+        except ValueError:
+            pass  # Sloppy JSON, try the forgiving parser.
+        parser = LooseJsonParser(content)
+        if parser.kind == 'punct' and parser.token == '{':
+            pairs = parser.parse_object()
+            parser.expect_end()
+            return [[unicode(key), unicode(val)] for key, val in pairs]
+        if parser.kind == 'punct' and parser.token == '[':
+            return self.json_items_to_rows(parser.iter_array(top=True))
+        raise Exception('Expected dict or list for JSON decoding.')
+
+    def sniff_delimiter(self, content):
+        """Choose the delimiter which splits a sample of ``content`` into the
+        most consistent number of (at least two) columns."""
+        import csv
+        sample = []
+        for line in ClipboardInputter().split(content):
+            line = line.strip()  # Like the splitter does.
+            if line:
+                sample.append(line)
+                if len(sample) >= DELIMITER_SAMPLE_SIZE:
+                    break
+        best, best_score = DELIMITER_CANDIDATES[0], 0
+        for delimiter in DELIMITER_CANDIDATES:
+            counts = dict()
+            try:
+                for vals in csv.reader(sample, delimiter=delimiter, skipinitialspace=True):
+                    counts[len(vals)] = counts.get(len(vals), 0) + 1
+            except csv.Error:
+                continue
+            if not counts:
+                continue
+            num_cols, frequency = max(counts.items(), key=lambda item: (item[1], item[0]))
+            if num_cols < 2:
+                continue
+            score = float(frequency) / len(sample)
+            if score > best_score:
+                best, best_score = delimiter, score
+        return best
 
     def generate_table_from_content(self, content):
         if os.linesep not in content:
@@ -383,14 +791,16 @@ class AbstractTableCommand(sublime_plugin.TextCommand):
             content += os.linesep
         try:
             if self.content_is_json(content):
+                # Goes right into the table, no need for asciitable.
                 content = self.convert_json_to_tabular(content)
-            org_content = content.encode('utf8')
-            # print repr(org_content)
-            content = asciitable.read(org_content, Reader=asciitable.NoHeader, data_start=0, delimiter='\t', Inputter=ClipboardInputter, header_Splitter=ClipboardSplitter)
-            if len(content.dtype.names) < 2:
-                content = asciitable.read(org_content, Reader=asciitable.NoHeader, data_start=0, delimiter=':', Inputter=ClipboardInputter)
-            if len(content.dtype.names) < 2:
-                content = asciitable.read(org_content, Reader=asciitable.NoHeader, data_start=0, delimiter=';', Inputter=ClipboardInputter)
+            else:
+                org_content = content.encode('utf8')
+                # print repr(org_content)
+                delimiter = self.sniff_delimiter(org_content)
+                if delimiter == ' ':
+                    # Spaces around a line would make up empty columns.
+                    org_content = EDGE_SPACES_REGEX.sub('', org_content)
+                content = asciitable.read(org_content, Reader=asciitable.NoHeader, data_start=0, delimiter=delimiter, Inputter=ClipboardInputter, Outputter=StringOutputter, header_Splitter=ClipboardSplitter, numpy=False, guess=False)
         except Exception, excp:
             name = type(excp).__name__
             sublime.error_message('%s: %s' % (name, excp))
@@ -399,15 +809,21 @@ class AbstractTableCommand(sublime_plugin.TextCommand):
         content = self.tablerize_data(content)
         return content
 
-    def parse_table_from_content(self, content):
-        content = content.splitlines()
-        # print content
-        data = []
-        row_data = []
-        for row in content:
+    def iter_table_rows(self, content, report=True):
+        """Yield the rows of the drawn table ``content`` one at a time as
+        lists of cell strings. Lines of multi-line cells are collected and
+        joined once the row is complete. Syntax errors are shown in a
+        dialog unless ``report`` is false."""
+        row_parts = None
+        for match in LINE_REGEX.finditer(content):
+            row = match.group(1).strip()
             # print 'row =', row.encode('utf8')
-            row = row.strip()
-            lchar, rchar = row[0], row[-1]
+            if not row:
+                if not match.group(2):
+                    break  # End of content.
+                lchar = rchar = None
+            else:
+                lchar, rchar = row[0], row[-1]
             # Top header.
             if LINE_H_TL_NORM == lchar and LINE_H_TR_NORM == rchar:
                 continue
@@ -416,8 +832,8 @@ class AbstractTableCommand(sublime_plugin.TextCommand):
                 continue
             # Row separator.
             if LINE_H_L_NORM == lchar and LINE_H_R_NORM == rchar:
-                data.append(row_data)
-                row_data = []
+                yield [u'\n'.join(parts) for parts in (row_parts or [])]
+                row_parts = None
                 continue
             # Row data.
             if LINE_V_L_NORM == lchar and LINE_V_R_NORM == rchar:
@@ -432,99 +848,35 @@ class AbstractTableCommand(sublime_plugin.TextCommand):
                     row = row.split(LINE_V_NORM)
                 row = [col.strip() for col in row]
                 # print row
-                # Put everything into row_data.
-                if not row_data:  # Generate new row_data.
-                    row_data = row
-                else:  # Add more to existing row_data.
+                # Put everything into row_parts.
+                if not row_parts:  # Generate new row_parts.
+                    row_parts = [[col] for col in row]
+                else:  # Add more to existing row_parts.
                     for pos, col in enumerate(row):
-                        if len(col.strip()):
-                            row_data[pos] += u'\n%s' % col
+                        if col:
+                            row_parts[pos].append(col)
                 continue
             msg = 'Syntax error: Subsequent lines of orgmode tables have to start and end with boundary chars. Line found:\n%s' % row
-            sublime.error_message(msg)
+            if report:
+                sublime.error_message(msg)
             raise Exception(msg)
-        if row_data:  # Is there something left to put in?
-            data.append(row_data)
-        # print data
-        return data
+        if row_parts:  # Is there something left to put in?
+            yield [u'\n'.join(parts) for parts in row_parts]
+
+    def parse_table_from_content(self, content):
+        return list(self.iter_table_rows(content))
 
     def find_content_point(self, cur):
-        view = self.view
-        rowcol = view.rowcol
-        text_point = view.text_point
-        match_selector = view.match_selector
-        if match_selector(cur, 'border.header'):
-            row, col = rowcol(cur)
-            cur = text_point(row + 1, col)
-        if match_selector(cur, 'border.row.separator'):
-            row, col = rowcol(cur)
-            if not match_selector(text_point(row + 1, col), 'border.row.separator'):
-                cur = text_point(row + 1, col)
-            if not match_selector(text_point(row - 1, col), 'border.row.separator'):
-                cur = text_point(row - 1, col)
-        if match_selector(cur, 'border.footer'):
-            row, col = rowcol(cur)
-            cur = text_point(row - 1, col)
-        while match_selector(cur, 'border.row.data.pre.space'):
-            row, col = rowcol(cur)
-            col += 1
-            cur = text_point(row, col)
-        while match_selector(cur, 'border.row.data.post.space'):
-            row, col = rowcol(cur)
-            col -= 1
-            cur = text_point(row, col)
-        while match_selector(cur, 'border.row.data'):
-            row, col = rowcol(cur)
-            if col > 0:
-                col -= 1
-            else:
-                break
-            cur = text_point(row, col)
-        while match_selector(cur, 'border.row.data'):
-            row, col = rowcol(cur)
-            col += 1
-            cur = text_point(row, col)
-        if match_selector(cur, 'border'):
-            return False
-        if not match_selector(cur, 'orgmode.table'):
+        table = get_table_index(self.view).find_table(cur)
+        if table is None:
             return False
-        return cur
+        return table.find_content_point(cur)
 
     def find_table_boundaries(self, cur):
-        view = self.view
-        extract_scope = view.extract_scope
-        scope_name = view.scope_name
-        line = view.line
-        rowcol = view.rowcol
-        text_point = view.text_point
-        scope = scope_name(cur)
-        # print scope
-        if scope.startswith('orgmode.table.simple'):
-            row, col = rowcol(cur)
-            length = len(line(text_point(row, 0)))
-            cur = text_point(row, length)
-            scope = scope_name(cur)
-        if 'orgmode.table.simple' in scope:
-            while 'orgmode.table.simple' in scope and 'border.header' not in scope:
-                row, col = rowcol(cur)
-                row -= 1
-                length = len(line(text_point(row, 0)))
-                cur = text_point(row, length)
-                scope = scope_name(cur)
-            cur = extract_scope(cur).begin()
-            begin = cur
-            while 'orgmode.table.simple' in scope and 'border.footer' not in scope:
-                row, col = rowcol(cur)
-                row += 1
-                length = len(line(text_point(row, 0)))
-                cur = text_point(row, 0)
-                scope = scope_name(cur)
-            cur = extract_scope(cur).end()
-            end = cur
-            sel = sublime.Region(begin, end)
-            # print sel
-        # print scope
-        return sel
+        table = get_table_index(self.view).find_table(cur)
+        if table is None:
+            return None
+        return sublime.Region(table.begin, table.end)
 
 
 class OrgmodePasteTableFromClipboardCommand(AbstractTableCommand):
@@ -573,9 +925,173 @@ class OrgmodePasteTableFromClipboardCommand(AbstractTableCommand):
             self.view.replace(edit, sel, data)
 
 
+class TableWriter(object):
+    '''Serializes table rows one at a time by passing chunks of text to
+    ``write``. Subclasses are registered in TABLE_WRITERS.'''
+
+    title = None  # Shown in the status message.
+
+    def __init__(self, write):
+        self.write = write
+        self.num_rows = 0
+
+    def begin(self):
+        pass
+
+    def row(self, row):
+        raise NotImplementedError()
+
+    def end(self):
+        pass
+
+
+class TabWriter(TableWriter):
+
+    title = 'tab separated'
+
+    def row(self, row):
+        write = self.write
+        if self.num_rows:
+            write(u'\n')
+        # Escape problematic columns with double quotes.
+        write(u'\t'.join([u'"%s"' % col if u'\n' in col or u'\t' in col else col
+                          for col in row]))
+
+
+class DecodingOutput(object):
+    '''File-like object passing utf8 encoded writes on as unicode.'''
+
+    def __init__(self, write):
+        self.write_text = write
+
+    def write(self, data):
+        self.write_text(data.decode('utf8'))
+
+
+class CsvWriter(TableWriter):
+
+    title = 'CSV encoded'
+
+    def begin(self):
+        import csv
+        # The csv module of Python 2 only handles byte strings.
+        self.writer = csv.writer(DecodingOutput(self.write))
+
+    def row(self, row):
+        self.writer.writerow([col.encode('utf8') for col in row])
+
+
+class JsonWriter(TableWriter):
+
+    title = 'JSON encoded'
+
+    def begin(self):
+        self.write(u'[')
+
+    def row(self, row):
+        if self.num_rows:
+            self.write(u', ')
+        self.write(json.dumps(row))
+
+    def end(self):
+        self.write(u']')
+
+
+class JsonLinesWriter(TableWriter):
+
+    title = 'JSON lines'
+
+    def row(self, row):
+        self.write(json.dumps(row))
+        self.write(u'\n')
+
+
+class MarkdownWriter(TableWriter):
+    '''The first row becomes the header.'''
+
+    title = 'Markdown'
+
+    def row(self, row):
+        write = self.write
+        cells = [col.replace(u'|', u'\\|').replace(u'\n', u'<br>') for col in row]
+        write(u'| %s |\n' % u' | '.join(cells))
+        if not self.num_rows:
+            write(u'|%s\n' % (u' --- |' * len(row)))
+
+
+class HtmlWriter(TableWriter):
+
+    title = 'HTML'
+
+    def begin(self):
+        self.write(u'<table>\n')
+
+    def row(self, row):
+        from cgi import escape
+        cells = [escape(col).replace(u'\n', u'<br>') for col in row]
+        self.write(u'<tr><td>%s</td></tr>\n' % u'</td><td>'.join(cells))
+
+    def end(self):
+        self.write(u'</table>\n')
+
+
+class OrgWriter(TableWriter):
+    '''Org mode pipe tables. Emacs aligns them on the first TAB.'''
+
+    title = 'org table'
+
+    def row(self, row):
+        # Pipe table cells can neither hold pipes nor line breaks.
+        cells = [col.replace(u'|', u'/').replace(u'\n', u' ') for col in row]
+        self.write(u'| %s |\n' % u' | '.join(cells))
+
+
+TABLE_WRITERS = dict(
+    tab=TabWriter,
+    csv=CsvWriter,
+    json=JsonWriter,
+    jsonl=JsonLinesWriter,
+    markdown=MarkdownWriter,
+    html=HtmlWriter,
+    org=OrgWriter,
+)
+
+
+def select_rows(rows, columns=None, match=None):
+    '''Keep only the given ``columns`` (indexes, in that order) of the rows
+    with a cell matching the regex ``match``.'''
+    regex = re.compile(match) if match else None
+    for row in rows:
+        if columns is not None:
+            row = [row[num] if -len(row) <= num < len(row) else u'' for num in columns]
+        if regex is not None and not [col for col in row if regex.search(col)]:
+            continue
+        yield row
+
+
+def export_rows(rows, writer_class):
+    '''Serialize ``rows`` with ``writer_class``. Returns the text and the
+    number of rows written.'''
+    chunks = []
+    writer = writer_class(chunks.append)
+    writer.begin()
+    for row in rows:
+        writer.row(row)
+        writer.num_rows += 1
+    writer.end()
+    return u''.join(chunks), writer.num_rows
+
+
 class OrgmodeCopyTableIntoClipboardCommand(AbstractTableCommand):
+    '''Arguments: format (see TABLE_WRITERS), columns (list of column
+    indexes to copy) and match (regex, only rows with a matching cell).'''
 
-    def run(self, edit, format='tab'):
+    def run(self, edit, format='tab', columns=None, match=None):
+        writer_class = TABLE_WRITERS.get(format)
+        if writer_class is None:
+            msg = 'Invalid format specified. Choices are: %s' % ', '.join(sorted(TABLE_WRITERS))
+            sublime.error_message(msg)
+            raise Exception(msg)
         sels = self.view.sel()
         cur = sels[0].begin()
         cur = self.find_content_point(cur)
@@ -585,54 +1101,161 @@ class OrgmodeCopyTableIntoClipboardCommand(AbstractTableCommand):
         # print cur
         region = self.find_table_boundaries(cur)
         # print region
-        content = self.view.substr(region)
-        # print content.encode('utf8')
-        data = self.parse_table_from_content(content)
-        # print data
-        num_rows = len(data)
-        if format == 'tab':
-            format = 'tab separated'
-            # Escape problematic columns with double quotes.
-            for row in data:
-                for pos, col in enumerate(row):
-                    if u'\n' in col or u'\t' in col:
-                        row[pos] = u'"%s"' % col
-            # Join columns into tab separated string.
-            data = [u'\t'.join(row) for row in data]
-            # Join rows with newlines.
-            data = u'\n'.join(data)
-        elif format == 'json':
-            format = 'JSON encoded'
-            import json
-            data = json.dumps(data)
-        elif format == 'csv':
-            format = 'CSV encoded'
-            import csv
-            from cStringIO import StringIO
-            fh = StringIO()
-            writer = csv.writer(fh)
-            for row in data:
-                writer.writerow(row)
-            fh.seek(0)
-            data = fh.read()
-        else:
-            msg = 'Invalid format specified. Choices are: tab, json'
-            sublime.error_message(msg)
-            raise Exception(msg)
+        rows = self.iter_table_rows(self.view.substr(region))
+        rows = select_rows(rows, columns, match)
+        data, num_rows = export_rows(rows, writer_class)
         # print repr(data)
         sublime.set_clipboard(data)
-        sublime.status_message('Copied table with %d rows as %s data into the clipboard.' % (num_rows, format))
+        sublime.status_message('Copied table with %d rows as %s data into the clipboard.' % (num_rows, writer_class.title))
+
+
+# Lines patched one by one at most. More are replaced in one go.
+MAX_LINE_PATCHES = 100
+
+
+class TableModel(object):
+    '''A table as it was last drawn into a view. Lets OrgmodeUpdateTableCommand
+    parse and draw only the rows edited since.'''
+
+    def __init__(self, begin, lines, table, init_indent, sub_indent):
+        self.begin = begin
+        self.lines = lines
+        self.table = table
+        self.init_indent = init_indent
+        self.sub_indent = sub_indent
+        self.positions = table.row_positions()
+
+    def find_row(self, line):
+        '''Returns the row shown on ``line`` or None for border lines.'''
+        num = bisect_right(self.positions, line) - 1
+        if num < 0 or line >= self.positions[num] + self.table.row_height(num):
+            return None
+        return num
+
+    def indent(self, num, line):
+        if num == 0:
+            return self.init_indent + line
+        return self.sub_indent + line
+
+
+# View id -> TableModel of the table updated last.
+table_models = dict()
 
 
 class OrgmodeUpdateTableCommand(AbstractTableCommand):
 
+    def update_rows(self, region, lines):
+        '''Parse and draw only the rows which changed since the table was
+        drawn last. Returns the new lines by line number or None if the whole
+        table has to be updated.'''
+        model = table_models.get(self.view.id())
+        if model is None or model.begin != region.begin() or len(model.lines) != len(lines):
+            return None
+        table = model.table
+        rows = set()
+        for num, line in enumerate(lines):
+            if line != model.lines[num]:
+                row = model.find_row(num)
+                if row is None:
+                    return None
+                rows.add(row)
+        changed = dict()
+        if not rows:
+            return changed
+        resized = False
+        for row in rows:
+            first = model.positions[row]
+            height = table.row_height(row)
+            data = self.parse_table_from_content(u'\n'.join(lines[first:first + height]))
+            if len(data) != 1 or len(data[0]) != len(table.data[row]):
+                return None
+            # Blank rows are dropped and quotes removed by asciitable.
+            row_content = u''.join(data[0])
+            if not row_content or u'"' in row_content:
+                return None
+            resized = table.update_row(row, data[0]) or resized
+            if table.row_height(row) != height:
+                return None
+        if resized:
+            # Only the resized columns differ within the lines.
+            for num, line in enumerate(table.draw_lines()):
+                changed[num] = model.indent(num, line)
+        else:
+            for row in rows:
+                first = model.positions[row]
+                for num, line in enumerate(table.draw_row_lines(row)):
+                    changed[first + num] = model.indent(first + num, line)
+        return changed
+
+    def patch_lines(self, edit, region, lines, changed):
+        '''Replace the changed part of each changed line, bottom-up.'''
+        nums = [num for num in sorted(changed) if changed[num] != lines[num]]
+        if not nums:
+            return False
+        starts = []
+        point = region.begin()
+        for line in lines:
+            starts.append(point)
+            point += len(line) + 1
+        if len(nums) > MAX_LINE_PATCHES:
+            first, last = nums[0], nums[-1]
+            content = u'\n'.join([changed.get(num, lines[num]) for num in xrange(first, last + 1)])
+            end = starts[last] + len(lines[last])
+            self.view.replace(edit, sublime.Region(starts[first], end), content)
+        else:
+            for num in reversed(nums):
+                old, new = lines[num], changed[num]
+                prefix = 0
+                limit = min(len(old), len(new))
+                while prefix < limit and old[prefix] == new[prefix]:
+                    prefix += 1
+                suffix = 0
+                limit -= prefix
+                while suffix < limit and old[-suffix - 1] == new[-suffix - 1]:
+                    suffix += 1
+                begin = starts[num] + prefix
+                end = starts[num] + len(old) - suffix
+                self.view.replace(edit, sublime.Region(begin, end), new[prefix:len(new) - suffix])
+        for num in nums:
+            lines[num] = changed[num]
+        return True
+
+    def draw_table(self, content, col, report=True):
+        '''Parse and draw the whole table ``content`` starting at column
+        ``col``. Returns the new content, the Table and the indents used.
+        Errors are shown in a dialog unless ``report`` is false.'''
+        # print content.encode('utf8')
+        indent = content.index(LINE_H_TL_NORM)
+        data = [u'\t'.join(row).encode('utf8') for row in self.iter_table_rows(content, report)]
+        # print repr(data)
+
+        try:
+            content = asciitable.read(data, Reader=asciitable.Tab, data_start=0, delimiter='\t', Inputter=ClipboardInputter, Outputter=StringOutputter, numpy=False, guess=False)
+            # print repr(content)
+        except Exception, excp:
+            if report:
+                name = type(excp).__name__
+                sublime.error_message('%s: %s' % (name, excp))
+            raise
+
+        table = Table()
+        table.extend(content)
+        content = table.draw()
+        # print content.encode('utf8')
+
+        # print col, repr(indent)
+        init_indent = ' ' * indent
+        sub_indent = ' ' * (col + indent)
+        # print repr(init_indent), repr(sub_indent)
+        content = self.indent_content(content, init_indent, sub_indent)
+        content += '\n'
+        # print content.encode('utf8')
+        return content, table, init_indent, sub_indent
+
     def run(self, edit):
         view = self.view
         substr = view.substr
-        parse_table_from_content = self.parse_table_from_content
-        tablerize_data = self.tablerize_data
         rowcol = view.rowcol
-        indent_content = self.indent_content
         text_point = view.text_point
         sel_bak = []
         sels = view.sel()
@@ -655,36 +1278,24 @@ class OrgmodeUpdateTableCommand(AbstractTableCommand):
             region = sel
 
             content = substr(region)
-            org_content = content
-            # print content.encode('utf8')
-            indent = content.index(LINE_H_TL_NORM)
-            data = parse_table_from_content(content)
-            # print data
-            data = [u'\t'.join(row).encode('utf8') for row in data]
-            # print repr(data)
-
-            try:
-                content = asciitable.read(data, Reader=asciitable.Tab, data_start=0, delimiter='\t', Inputter=ClipboardInputter, guess=False)
-                # print repr(content)
-            except Exception, excp:
-                name = type(excp).__name__
-                sublime.error_message('%s: %s' % (name, excp))
-                raise
-
-            content = tablerize_data(content)
-            # print content.encode('utf8')
+            lines = content.split(u'\n')
+            changed = self.update_rows(region, lines)
+            if changed is not None:
+                if self.patch_lines(edit, region, lines, changed):
+                    table_models[view.id()].lines = lines
+                    table_indexes.pop(view.id(), None)
+                    updated += 1
+                continue
 
+            org_content = content
             row, col = rowcol(region.begin())
-            # print row, col, repr(indent)
-            init_indent = ' ' * indent
-            sub_indent = ' ' * (col + indent)
-            # print repr(init_indent), repr(sub_indent)
-            content = indent_content(content, init_indent, sub_indent)
-            content += '\n'
-            # print content.encode('utf8')
+            content, table, init_indent, sub_indent = self.draw_table(content, col)
             if content != org_content:
                 view.replace(edit, region, content)
-                updated = True
+                table_indexes.pop(view.id(), None)
+                updated += 1
+            table_models[view.id()] = TableModel(
+                region.begin(), content.split(u'\n'), table, init_indent, sub_indent)
         # Restore selections.
         sels.clear()
         for begin, end in sel_bak:
@@ -695,24 +1306,85 @@ class OrgmodeUpdateTableCommand(AbstractTableCommand):
             sublime.status_message('Nothing to update.')
 
 
+class OrgmodeUpdateAllTablesCommand(OrgmodeUpdateTableCommand):
+
+    def run(self, edit):
+        view = self.view
+        rowcol = view.rowcol
+        text_point = view.text_point
+        start = time.time()
+        sel_bak = []
+        sels = view.sel()
+        for sel in sels:
+            sel_bak.append((rowcol(sel.begin()), rowcol(sel.end())))
+        tables = get_table_index(view).tables
+        updated = 0
+        failed = 0
+        # Bottom-up so that the offsets of the tables above stay valid.
+        for table in reversed(tables):
+            if LINE_V_L_NORM not in table.kinds:
+                continue  # Table without content.
+            region = sublime.Region(table.begin, table.end)
+            org_content = view.substr(region)
+            try:
+                content = self.draw_table(org_content, table.begin - table.line_begin, False)[0]
+            except Exception, excp:
+                # No dialog per broken table, the status message sums them up.
+                print 'Table at line %d not updated: %r' % (rowcol(table.begin)[0] + 1, excp)
+                failed += 1
+                continue
+            if content != org_content:
+                view.replace(edit, region, content)
+                updated += 1
+        if updated:
+            table_indexes.pop(view.id(), None)
+            table_models.pop(view.id(), None)
+        # Restore selections.
+        sels.clear()
+        for begin, end in sel_bak:
+            sels.add(sublime.Region(text_point(*begin), text_point(*end)))
+        msg = 'Updated %d of %d tables in %.2fs.' % (updated, len(tables), time.time() - start)
+        if failed:
+            msg += ' %d tables could not be parsed.' % failed
+        sublime.status_message(msg)
+
+
+# Milliseconds to wait for the cursor to settle before checking it.
+COMMAND_MODE_CHECK_DELAY = 50
+
+# View id -> begins and ends of the table borders, sorted.
+table_borders = dict()
+
+
+def get_table_borders(view):
+    borders = table_borders.get(view.id())
+    if borders is None:
+        regions = view.find_by_selector('orgmode.table.simple border')
+        borders = table_borders[view.id()] = (
+            [region.begin() for region in regions],
+            [region.end() for region in regions])
+    return borders
+
+
 class OrgmodeTableInputObserver(sublime_plugin.EventListener):
 
+    def __init__(self):
+        super(OrgmodeTableInputObserver, self).__init__()
+        self.pending = dict()
+
+    def touches_border(self, view):
+        begins, ends = get_table_borders(view)
+        for sel in view.sel():
+            # First border ending behind the selection start.
+            pos = bisect_right(ends, sel.begin())
+            if pos < len(begins) and begins[pos] <= sel.end():
+                return True
+        return False
+
     def check(self, view):
-        sels = view.sel()
         settings = view.settings()
-        command_mode_enabled = False
         org_mode = bool(settings.get('command_mode', False))
-        match = view.match_selector
-        for sel in sels:
-            found = False
-            for x in range(sel.begin(), sel.end() + 1):
-                if match(x, 'orgmode.table.simple border'):
-                    # print sel
-                    found = True
-                    break
-            if found:
-                command_mode_enabled = True
-                break
+        command_mode_enabled = self.touches_border(view)
         if command_mode_enabled != org_mode:
             if command_mode_enabled:
                 print 'Enabled command mode.'
@@ -720,15 +1392,38 @@ class OrgmodeTableInputObserver(sublime_plugin.EventListener):
                 print 'Disabled command mode.'
             settings.set('command_mode', command_mode_enabled)
 
+    def check_later(self, view):
+        view_id = view.id()
+        pending = self.pending.get(view_id, 0) + 1
+        self.pending[view_id] = pending
+
+        def check():
+            if self.pending.get(view_id) != pending:
+                return  # The selection moved on meanwhile.
+            del self.pending[view_id]
+            if view.match_selector(0, 'text.orgmode'):
+                self.check(view)
+        sublime.set_timeout(check, COMMAND_MODE_CHECK_DELAY)
+
     def on_selection_modified(self, view):
         if view.match_selector(0, 'text.orgmode'):
-            self.check(view)
+            self.check_later(view)
 
     def on_activated(self, view):
         if view.match_selector(0, 'text.orgmode'):
             self.check(view)
 
-    # Disabled - causes problems with undo history.
+    def on_modified(self, view):
+        table_borders.pop(view.id(), None)
+        table_indexes.pop(view.id(), None)
+
+    def on_close(self, view):
+        table_models.pop(view.id(), None)
+        table_borders.pop(view.id(), None)
+        table_indexes.pop(view.id(), None)
+        self.pending.pop(view.id(), None)
+
+    # Realigning while typing is disabled - causes problems with undo history.
     # def on_modified(self, view):
     #     sel = view.sel()[0]
     #     if not view.match_selector(sel.end(), 'text.orgmode orgmode.table.simple'):
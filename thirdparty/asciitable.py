@@ -72,6 +72,12 @@ except NameError:
 # Default setting for guess parameter in read()
 GUESS = True
 
+# Number of lines each guess is first tried on before reading the whole table
+GUESS_SAMPLE_LINES = 50
+
+# Number of values converted at once while inferring the type of a column
+INFER_BLOCK_SIZE = 1000
+
 class Keyword(object):
     """Table keyword"""
     def __init__(self, name, value, units=None, comment=None, format=None):
@@ -589,6 +595,28 @@ def convert_numpy(numpy_type):
         return numpy.array(vals, numpy_type)
     return converter
 
+def infer_type(vals):
+    """Return the first of ``int``, ``float`` and ``str`` that all ``vals``
+    convert to along with the converted values.  This is done in a single
+    pass over blocks of ``INFER_BLOCK_SIZE`` values: they are converted to
+    int until one fails and from that block on to float.  Only if that fails
+    too the values are converted to str.
+    """
+    python_type = int
+    data = []
+    for start in range(0, len(vals), INFER_BLOCK_SIZE):
+        block = vals[start:start + INFER_BLOCK_SIZE]
+        while True:
+            try:
+                data.extend(list(map(python_type, block)))
+                break
+            except (TypeError, ValueError):
+                if python_type is not int:
+                    return str, [str(x) for x in vals]
+                python_type = float
+                data = [float(x) for x in data]
+    return python_type, data
+
 class BaseOutputter(object):
     """Output table as a dict of column objects keyed on column name.  The
     table data are stored as plain python lists within the column objects.
@@ -604,6 +632,10 @@ class BaseOutputter(object):
         table.dtype.names = tuple(x.name for x in cols)
         return table
 
+    def _convert_inferred(self, python_type, data):
+        """Store the values converted by infer_type()."""
+        return data
+
     def _convert_vals(self, cols):
         for col in cols:
             converters = self.converters.get(col.name, self.default_converter)
@@ -613,6 +645,13 @@ class BaseOutputter(object):
             except TypeError:
                 col.converters = [converters]
 
+            if converters is self.default_converter:
+                # Find the type in one pass instead of trying each converter
+                # on the whole column.
+                python_type, data = infer_type(col.str_vals)
+                col.data = self._convert_inferred(python_type, data)
+                continue
+
             while not hasattr(col, 'data'):
                 try:
                     col.data = col.converters[0](col.str_vals)
@@ -659,6 +698,10 @@ class NumpyOutputter(BaseOutputter):
         default_converter = [convert_numpy(numpy.int),
                              convert_numpy(numpy.float),
                              convert_numpy(numpy.str)]
+        numpy_types = {int: numpy.int, float: numpy.float, str: numpy.str}
+
+    def _convert_inferred(self, python_type, data):
+        return numpy.array(data, self.numpy_types[python_type])
 
     def __call__(self, cols):
         self._convert_vals(cols)
@@ -920,14 +963,12 @@ def _is_number(x):
         pass
     return False
     
-def _guess(table, read_kwargs):
-    """Try to read the table using various sets of keyword args. First try the
-    original args supplied in the read() call. Then try the standard guess
-    keyword args. For each key/val pair specified explicitly in the read()
-    call make sure that if there is a corresponding definition in the guess
-    then it must have the same val.  If not then skip this guess."""
-
-    # First try guessing
+def _get_guess_candidates(read_kwargs):
+    """Yield the original read() args and then each of the standard guess
+    keyword args combined with them.  For each key/val pair specified
+    explicitly in the read() call make sure that if there is a corresponding
+    definition in the guess then it must have the same val.  If not then skip
+    this guess."""
     for guess_kwargs in [read_kwargs.copy()] + _get_guess_kwargs_list():
         for key, val in read_kwargs.items():
             # Do guess_kwargs.update(read_kwargs) except that if guess_args has
@@ -936,28 +977,45 @@ def _guess(table, read_kwargs):
                 guess_kwargs[key] = val
             elif val != guess_kwargs[key]:
                 continue
+        yield guess_kwargs
+
+def _read_guess(guess_kwargs, lines):
+    """Read ``lines`` with ``guess_kwargs``.  When guessing impose additional
+    requirements on column names and number of cols."""
+    reader = get_reader(**guess_kwargs)
+    dat = reader.read(lines)
+    bads = [" ", ",", "|", "\t", "'", '"']
+    if (len(reader.cols) <= 1 or
+        any(_is_number(col.name) or 
+             len(col.name) == 0 or 
+             col.name[0] in bads or 
+             col.name[-1] in bads for col in reader.cols)):
+        raise ValueError
+    return dat
 
+def _guess(table, read_kwargs):
+    """Try to read the table using various sets of keyword args (see
+    _get_guess_candidates).  The table is split into lines once.  The
+    candidates are tried in order on the first ``GUESS_SAMPLE_LINES`` lines
+    and only the first one that reads the sample is used to read the whole
+    table.  If that fails the next candidate gets its turn."""
+    Inputter = read_kwargs.get('Inputter', BaseInputter)
+    lines = list(Inputter().get_lines(table))
+    sample = lines[:GUESS_SAMPLE_LINES]
+    for guess_kwargs in _get_guess_candidates(read_kwargs):
         try:
-            reader = get_reader(**guess_kwargs)
-            dat = reader.read(table)
-            # When guessing impose additional requirements on column names and number of cols
-            bads = [" ", ",", "|", "\t", "'", '"']
-            if (len(reader.cols) <= 1 or
-                any(_is_number(col.name) or 
-                     len(col.name) == 0 or 
-                     col.name[0] in bads or 
-                     col.name[-1] in bads for col in reader.cols)):
-                raise ValueError
-            return dat
+            dat = _read_guess(guess_kwargs, sample)
+            if len(sample) == len(lines):
+                return dat
+            return _read_guess(guess_kwargs, lines)
         except (InconsistentTableError, ValueError):
             pass
-    else:
-        # failed all guesses, try the original read_kwargs without column requirements
-        try:
-            reader = get_reader(**read_kwargs)
-            return reader.read(table)
-        except (InconsistentTableError, ValueError):
-            raise InconsistentTableError('Unable to read table with guess=True.')
+    # failed all guesses, try the original read_kwargs without column requirements
+    try:
+        reader = get_reader(**read_kwargs)
+        return reader.read(lines)
+    except (InconsistentTableError, ValueError):
+        raise InconsistentTableError('Unable to read table with guess=True.')
     
 def _get_guess_kwargs_list():
     guess_kwargs_list = [dict(Reader=Rdb),